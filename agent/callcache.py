@@ -0,0 +1,42 @@
+import contextvars
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+# Cache shared by the runs executing in this context, e.g. all topics of one /batch;
+# None (the default) means LLM and search results are not reused across calls.
+current_cache = contextvars.ContextVar("call_cache", default=None)
+
+
+class CallCache:
+    """Thread-safe LRU of completed LLM and search results, keyed like agent.singleflight.
+
+    Only successful results are stored, so a failed call is retried by the next caller.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -1,6 +1,15 @@
+import os
+from functools import partial
 from langgraph.graph import StateGraph, END
+from langgraph.types import Send
 from agent.states import AgentState
-from agent.nodes import planner_node, research_router_node, researcher_node, research_merge_node, writer_node, reviewer_node, human_review_node
+from agent.metrics import instrument_node
+from agent import nodes
+from agent.nodes import planner_node, research_router_node, researcher_node, research_merge_node, writer_node, reviewer_node, human_review_node, section_pipeline_node, integrator_node, report_frame_node, research_digest_node, plan_sections, resolve_assembly_mode
+
+# "staged": all research, then all sections. "pipelined": each plan section researches and
+# drafts on its own branch, and integration waits only for the section drafts.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "staged")
 
 def should_continue(state: AgentState):
     critique = state.get("critique", "")
@@ -16,22 +25,61 @@ def human_should_continue(state: AgentState):
         return "writer"
     return "end"
 
-def build_graph(checkpointer, visualize: bool = False):
+def route_research(state: AgentState):
+    critique = state.get("critique", "")
+    if isinstance(critique, str) and critique.strip().upper().startswith("RESEARCH:"):
+        # Reviewer asked for targeted research: one search, then a full rewrite.
+        return "researcher"
+    branch = {
+        "task": state["task"],
+        "research_chunks": state.get("research_chunks", []),
+        "critique": critique,
+        "human_feedback": state.get("human_feedback", ""),
+        "history_context": state.get("history_context", ""),
+    }
+    plan_items = plan_sections(state.get("plan", []))
+    sends = [Send("section_pipeline", dict(branch, section=section)) for section in plan_items]
+    if resolve_assembly_mode(plan_items) == "local":
+        sends.append(Send("report_frame", dict(branch, plan_items=plan_items)))
+    return sends
+
+def build_graph(checkpointer, visualize: bool = False, mode: str = None):
+    # Nodes use the process-wide model and search backends; swap those with nodes.configure().
+    mode = mode or PIPELINE_MODE
     workflow = StateGraph(AgentState)
 
-    workflow.add_node("planner", planner_node)
-    workflow.add_node("research_router", research_router_node)
-    workflow.add_node("researcher", researcher_node)
-    workflow.add_node("research_merge", research_merge_node)
-    workflow.add_node("writer", writer_node)
-    workflow.add_node("reviewer", reviewer_node)
-    workflow.add_node("human_review_node", human_review_node)
+    # The planner starts searching plan steps while its reply streams: only the first step
+    # in staged mode (the one researcher_node searches), every section when pipelined.
+    prefetch = None if mode == "pipelined" else 1
+    workflow.add_node("planner", instrument_node("planner", partial(planner_node, prefetch=prefetch)))
+    workflow.add_node("research_router", instrument_node("research_router", research_router_node))
+    workflow.add_node("researcher", instrument_node("researcher", researcher_node))
+    workflow.add_node("research_merge", instrument_node("research_merge", research_merge_node))
+    workflow.add_node("writer", instrument_node("writer", writer_node))
+    workflow.add_node("reviewer", instrument_node("reviewer", reviewer_node))
+    workflow.add_node("human_review_node", instrument_node("human_review_node", human_review_node))
 
     workflow.set_entry_point("planner")
     workflow.add_edge("planner", "research_router")
-    workflow.add_edge("research_router", "researcher")
+    if mode == "pipelined":
+        workflow.add_node("section_pipeline", instrument_node("section_pipeline", section_pipeline_node))
+        workflow.add_node("report_frame", instrument_node("report_frame", report_frame_node))
+        workflow.add_node("integrator", instrument_node("integrator", integrator_node))
+        workflow.add_conditional_edges(
+            "research_router", route_research, ["section_pipeline", "report_frame", "researcher"]
+        )
+        workflow.add_edge("section_pipeline", "integrator")
+        workflow.add_edge("report_frame", "integrator")
+        workflow.add_edge("integrator", "reviewer")
+    else:
+        workflow.add_edge("research_router", "researcher")
     workflow.add_edge("researcher", "research_merge")
-    workflow.add_edge("research_merge", "writer")
+    if nodes.RESEARCH_DIGEST:
+        workflow.add_node("research_digest", instrument_node("research_digest", research_digest_node))
+        workflow.add_edge("research_merge", "research_digest")
+        workflow.add_edge("research_digest", "writer")
+    else:
+        workflow.add_edge("research_merge", "writer")
     workflow.add_edge("writer", "reviewer")
 
     workflow.add_conditional_edges(
@@ -0,0 +1,52 @@
+import json
+import re
+from typing import List
+
+_ARRAY_START = re.compile(r'"plan"\s*:\s*\[')
+_decoder = json.JSONDecoder()
+
+
+class PlanStepParser:
+    """Incrementally pull completed strings out of the `"plan": [...]` array of a streamed JSON reply.
+
+    Tolerates code fences or other text before the object. Anything other than a list of
+    strings stops the parser early; the caller's full parse of the final text decides.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.steps: List[str] = []
+        self.done = False
+        self._pos = None
+
+    def feed(self, text: str) -> List[str]:
+        """Append streamed text; returns the steps completed by it."""
+        if self.done or not text:
+            return []
+        self.buffer += text
+        if self._pos is None:
+            match = _ARRAY_START.search(self.buffer)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        found = []
+        while True:
+            pos = self._pos
+            while pos < len(self.buffer) and self.buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(self.buffer):
+                break
+            char = self.buffer[pos]
+            if char != '"':
+                self.done = True  # "]" ends the array; anything else is not a plain string list
+                break
+            try:
+                step, end = _decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                break  # string still open; wait for more text
+            self._pos = end
+            if isinstance(step, str) and step.strip():
+                self.steps.append(step)
+                found.append(step)
+        return found
@@ -0,0 +1,364 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from agent import profiling
+
+# Estimated price per 1K tokens as (input, output), in CNY. Override with LLM_PRICES='{"model": [in, out]}'.
+DEFAULT_PRICES = {"deepseek-v3.1": (0.004, 0.012)}
+LATENCY_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+LOCK_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+MAX_TRACKED_THREADS = 200
+
+current_thread = contextvars.ContextVar("metrics_thread", default="")
+current_node = contextvars.ContextVar("metrics_node", default="")
+current_section = contextvars.ContextVar("metrics_section", default="")
+
+
+def _load_prices() -> Dict[str, tuple]:
+    prices = dict(DEFAULT_PRICES)
+    raw = os.getenv("LLM_PRICES")
+    if raw:
+        try:
+            prices.update({k: tuple(v) for k, v in json.loads(raw).items()})
+        except (ValueError, TypeError) as e:
+            print(f"Ignoring invalid LLM_PRICES: {e}")
+    return prices
+
+
+def model_name(model) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+
+
+def _text_of(messages) -> str:
+    return "".join(str(getattr(m, "content", m)) for m in messages)
+
+
+def _estimate_tokens(text: str) -> int:
+    # Rough: ~2 characters per token for mixed Chinese/English text.
+    return len(text) // 2 + 1 if text else 0
+
+
+def token_usage(messages, response) -> tuple:
+    """(input_tokens, output_tokens) from the provider's usage metadata, else estimated."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    reported = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    if reported.get("prompt_tokens") is not None:
+        return reported.get("prompt_tokens", 0), reported.get("completion_tokens", 0)
+    output = getattr(response, "content", "") if response is not None else ""
+    return _estimate_tokens(_text_of(messages)), _estimate_tokens(str(output))
+
+
+class _Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * len(bounds)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+class MetricsRegistry:
+    """Process-wide counters plus a bounded per-thread record of node, LLM and search calls."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prices = _load_prices()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._node_seconds = defaultdict(_Histogram)
+            self._node_queue_wait = defaultdict(float)
+            self._llm_seconds = defaultdict(_Histogram)
+            self._llm_errors = defaultdict(int)
+            self._llm_tokens = defaultdict(int)
+            self._llm_cost = defaultdict(float)
+            self._search_seconds = defaultdict(_Histogram)
+            self._search_errors = defaultdict(int)
+            self._lock_wait = defaultdict(lambda: _Histogram(LOCK_WAIT_BUCKETS))
+            self._snippets = defaultdict(int)
+            self._shared_calls = defaultdict(int)
+            self._fallbacks = defaultdict(int)
+            self._threads: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _thread(self, thread_id: str) -> Dict[str, Any]:
+        record = self._threads.get(thread_id)
+        if record is None:
+            record = {"nodes": [], "llm_calls": [], "search_calls": [], "snippets": 0, "duplicate_snippets": 0, "last_end": None}
+            self._threads[thread_id] = record
+            while len(self._threads) > MAX_TRACKED_THREADS:
+                self._threads.popitem(last=False)
+        else:
+            self._threads.move_to_end(thread_id)
+        return record
+
+    def start_run(self, thread_id: str):
+        """Mark the moment a run (or resume) was requested; the first node's queue wait counts from here."""
+        with self._lock:
+            self._thread(thread_id)["last_end"] = time.time()
+
+    def cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
+        price_in, price_out = self.prices.get(model, (0.0, 0.0))
+        return input_tokens / 1000 * price_in + output_tokens / 1000 * price_out
+
+    def record_node(self, thread_id: str, node: str, started: float, seconds: float):
+        with self._lock:
+            self._node_seconds[node].observe(seconds)
+            queue_wait = 0.0
+            if thread_id:
+                record = self._thread(thread_id)
+                if record["last_end"] is not None:
+                    queue_wait = max(0.0, started - record["last_end"])
+                record["last_end"] = started + seconds
+                record["nodes"].append(
+                    {"node": node, "started": started, "seconds": seconds, "queue_wait": queue_wait}
+                )
+            self._node_queue_wait[node] += queue_wait
+
+    def record_llm(self, model: str, messages, response, seconds: float, error: bool = False):
+        node = current_node.get() or "unknown"
+        input_tokens, output_tokens = token_usage(messages, response) if not error else (0, 0)
+        cost = self.cost(model, input_tokens, output_tokens)
+        with self._lock:
+            self._llm_seconds[(node, model)].observe(seconds)
+            if error:
+                self._llm_errors[(node, model)] += 1
+            self._llm_tokens[(node, model, "input")] += input_tokens
+            self._llm_tokens[(node, model, "output")] += output_tokens
+            self._llm_cost[(node, model)] += cost
+            thread_id = current_thread.get()
+            if thread_id:
+                self._thread(thread_id)["llm_calls"].append({
+                    "node": node,
+                    "section": current_section.get(),
+                    "model": model,
+                    "seconds": seconds,
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                    "cost": cost,
+                    "error": error,
+                })
+
+    def record_search(self, provider: str, query: str, seconds: float, error: bool = False):
+        node = current_node.get() or "unknown"
+        with self._lock:
+            self._search_seconds[provider].observe(seconds)
+            if error:
+                self._search_errors[provider] += 1
+            thread_id = current_thread.get()
+            if thread_id:
+                self._thread(thread_id)["search_calls"].append({
+                    "node": node,
+                    "section": current_section.get(),
+                    "provider": provider,
+                    "query": query,
+                    "seconds": seconds,
+                    "error": error,
+                })
+
+    def record_dedup(self, seen: int, dropped: int):
+        """Snippets seen and dropped as near-duplicates by one research merge."""
+        with self._lock:
+            self._snippets["kept"] += seen - dropped
+            self._snippets["dropped"] += dropped
+            thread_id = current_thread.get()
+            if thread_id:
+                record = self._thread(thread_id)
+                record["snippets"] += seen
+                record["duplicate_snippets"] += dropped
+
+    def record_shared_call(self, kind: str):
+        """A call answered by an identical one already in flight (see agent.singleflight)."""
+        with self._lock:
+            self._shared_calls[kind] += 1
+
+    def record_fallback(self, node: str, model: str, reason: str):
+        """A model in a node's chain failed ("error") or was too slow ("timeout"); the next one is tried."""
+        with self._lock:
+            self._fallbacks[(node, model, reason)] += 1
+
+    def record_lock_wait(self, lock: str, seconds: float):
+        with self._lock:
+            self._lock_wait[lock].observe(seconds)
+
+    @contextmanager
+    def llm_call(self, model, messages):
+        """Time one chat-model call; assign the response to the yielded dict's "response"."""
+        call = {"response": None}
+        start = time.perf_counter()
+        try:
+            yield call
+        except Exception:
+            self.record_llm(model_name(model), messages, None, time.perf_counter() - start, error=True)
+            raise
+        self.record_llm(model_name(model), messages, call["response"], time.perf_counter() - start)
+
+    @contextmanager
+    def search_call(self, provider: str, query: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record_search(provider, query, time.perf_counter() - start, error=True)
+            raise
+        self.record_search(provider, query, time.perf_counter() - start)
+
+    def thread_profile(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Per-node and per-section breakdown for one thread, or None if it was never seen."""
+        with self._lock:
+            record = self._threads.get(thread_id)
+            if record is None:
+                return None
+            spans = list(record["nodes"])
+            llm_calls = list(record["llm_calls"])
+            search_calls = list(record["search_calls"])
+            snippets, duplicates = record["snippets"], record["duplicate_snippets"]
+
+        nodes: Dict[str, Dict[str, Any]] = {}
+        for span in spans:
+            item = nodes.setdefault(span["node"], {
+                "node": span["node"], "calls": 0, "seconds": 0.0, "queue_wait": 0.0,
+                "llm_calls": 0, "llm_seconds": 0.0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0,
+                "search_calls": 0, "search_seconds": 0.0,
+            })
+            item["calls"] += 1
+            item["seconds"] += span["seconds"]
+            item["queue_wait"] += span["queue_wait"]
+        sections: Dict[str, Dict[str, Any]] = {}
+        for call in llm_calls:
+            item = nodes.get(call["node"])
+            if item is not None:
+                item["llm_calls"] += 1
+                item["llm_seconds"] += call["seconds"]
+                item["input_tokens"] += call["input_tokens"]
+                item["output_tokens"] += call["output_tokens"]
+                item["cost"] += call["cost"]
+            if call["section"]:
+                sec = sections.setdefault(call["section"], {
+                    "section": call["section"], "llm_calls": 0, "seconds": 0.0,
+                    "input_tokens": 0, "output_tokens": 0, "cost": 0.0,
+                })
+                sec["llm_calls"] += 1
+                sec["seconds"] += call["seconds"]
+                sec["input_tokens"] += call["input_tokens"]
+                sec["output_tokens"] += call["output_tokens"]
+                sec["cost"] += call["cost"]
+        for call in search_calls:
+            item = nodes.get(call["node"])
+            if item is not None:
+                item["search_calls"] += 1
+                item["search_seconds"] += call["seconds"]
+
+        return {
+            "thread_id": thread_id,
+            "totals": {
+                "node_seconds": sum(s["seconds"] for s in spans),
+                "queue_wait": sum(s["queue_wait"] for s in spans),
+                "llm_calls": len(llm_calls),
+                "llm_seconds": sum(c["seconds"] for c in llm_calls),
+                "input_tokens": sum(c["input_tokens"] for c in llm_calls),
+                "output_tokens": sum(c["output_tokens"] for c in llm_calls),
+                "cost": sum(c["cost"] for c in llm_calls),
+                "search_calls": len(search_calls),
+                "search_seconds": sum(c["seconds"] for c in search_calls),
+                "snippets": snippets,
+                "duplicate_snippets": duplicates,
+                "dedup_ratio": duplicates / snippets if snippets else 0.0,
+            },
+            "nodes": list(nodes.values()),
+            "sections": list(sections.values()),
+            "spans": spans,
+        }
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, series: Dict[Any, _Histogram], label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in sorted(series.items()):
+                values = key if isinstance(key, tuple) else (key,)
+                labels = ",".join(f'{n}="{v}"' for n, v in zip(label_names, values))
+                for bound, count in zip(hist.bounds, hist.buckets):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"{name}_sum{{{labels}}} {hist.total:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        def counter(name: str, help_text: str, series: Dict[Any, float], label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(series.items()):
+                values = key if isinstance(key, tuple) else (key,)
+                labels = ",".join(f'{n}="{v}"' for n, v in zip(label_names, values))
+                lines.append(f"{name}{{{labels}}} {value}")
+
+        with self._lock:
+            histogram("research_node_duration_seconds", "Wall time per graph node run.",
+                      self._node_seconds, ("node",))
+            counter("research_node_queue_wait_seconds_total", "Time between a node becoming runnable and starting.",
+                    self._node_queue_wait, ("node",))
+            histogram("research_llm_duration_seconds", "Wall time per chat-model call.",
+                      self._llm_seconds, ("node", "model"))
+            counter("research_llm_errors_total", "Failed chat-model calls.", self._llm_errors, ("node", "model"))
+            counter("research_llm_tokens_total", "Chat-model tokens (estimated when the provider reports none).",
+                    self._llm_tokens, ("node", "model", "direction"))
+            counter("research_llm_cost_total", "Estimated chat-model cost.", self._llm_cost, ("node", "model"))
+            histogram("research_search_duration_seconds", "Wall time per search call.",
+                      self._search_seconds, ("provider",))
+            counter("research_search_errors_total", "Failed search calls.", self._search_errors, ("provider",))
+            counter("research_snippets_total", "Search snippets merged, by whether they were kept or dropped as near-duplicates.",
+                    self._snippets, ("outcome",))
+            counter("research_shared_calls_total", "LLM and search calls served by an identical in-flight call.",
+                    self._shared_calls, ("kind",))
+            counter("research_llm_fallbacks_total", "Chat-model attempts abandoned for the next model in the chain.",
+                    self._fallbacks, ("node", "model", "reason"))
+            histogram("research_lock_wait_seconds", "Time spent waiting for a SQLite connection lock (history writes, checkpoints).",
+                      self._lock_wait, ("lock",))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def instrument_node(name: str, fn):
+    """Wrap a graph node so its runs, and the LLM/search calls inside it, are attributed to it."""
+
+    def wrapper(state, config):
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id", "")
+        thread_token = current_thread.set(thread_id)
+        node_token = current_node.set(name)
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            return profiling.node_call(fn, state)
+        finally:
+            registry.record_node(thread_id, name, started, time.perf_counter() - start)
+            current_node.reset(node_token)
+            current_thread.reset(thread_token)
+
+    wrapper.__name__ = getattr(fn, "__name__", name)
+    return wrapper
+
+
+@contextmanager
+def section(title: str):
+    token = current_section.set(title)
+    try:
+        yield
+    finally:
+        current_section.reset(token)
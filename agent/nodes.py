@@ -1,16 +1,32 @@
 import os
 import json
+import hashlib
+import re
+import contextvars
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
 from langchain_community.tools import DuckDuckGoSearchRun
 from tavily import TavilyClient
 
+from agent import metrics
+from agent.jsonstream import PlanStepParser
+from agent.recording import prompt_key, recorder
+from agent.routing import ModelRouter, parse_routes
+from agent.callcache import current_cache
+from agent.singleflight import llm_calls, search_calls
 from agent.states import AgentState
-from agent.prompts import PLANNER_SYSTEM_PROMPT, WRITER_PROMPT_TEMPLATE, REVIEWER_PROMPT_TEMPLATE, SECTION_WRITER_PROMPT_TEMPLATE, FINAL_WRITER_PROMPT_TEMPLATE
+from agent.similarity import (
+    draft_signature, near_duplicate_groups, overlap_score, select_relevant, signature_similarity, split_sections, targeted_sections,
+    text_similarity,
+)
+from agent.prompts import PLANNER_SYSTEM_PROMPT, WRITER_PROMPT_TEMPLATE, REVIEWER_PROMPT_TEMPLATE, SECTION_WRITER_PROMPT_TEMPLATE, FINAL_WRITER_PROMPT_TEMPLATE, INTRO_PROMPT_TEMPLATE, CONCLUSION_PROMPT_TEMPLATE, REVIEWER_DIFF_PROMPT_TEMPLATE, DIGEST_PROMPT_TEMPLATE
 
 env_path = Path(__file__).resolve().parents[1] / ".env"
 load_dotenv(env_path, override=False)
@@ -20,17 +36,231 @@ if os.getenv("LANGSMITH_API_KEY") and not os.getenv("LANGSMITH_TRACING"):
     os.environ["LANGSMITH_TRACING"] = "true"
 
 # Initialize LLM
-llm = ChatOpenAI(
-    model="deepseek-v3.1",
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+def dashscope_model(name: str) -> ChatOpenAI:
+    return ChatOpenAI(
+        model=name,
+        api_key=os.getenv("DASHSCOPE_API_KEY"),
+        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+    )
+
+
+llm = dashscope_model("deepseek-v3.1")
+
+# Per-node models with ordered fallbacks, by graph node name, e.g.
+# MODEL_ROUTES="planner=qwen-turbo,deepseek-v3.1;reviewer=qwen-turbo,deepseek-v3.1"; nodes without
+# an entry use the "default" chain (deepseek-v3.1 alone unless configured). An attempt that
+# raises, or takes longer than LLM_TIMEOUT seconds (0 disables), moves on to the next model;
+# the timeout only applies while there is a next model, so single-model chains never time out.
+MODEL_ROUTES = parse_routes(os.getenv("MODEL_ROUTES", ""), default=["deepseek-v3.1"])
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+router = ModelRouter(
+    {name: llm if name == "deepseek-v3.1" else dashscope_model(name) for chain in MODEL_ROUTES.values() for name in chain},
+    MODEL_ROUTES,
+    timeout=LLM_TIMEOUT,
 )
 
 # Fallback search tool
 search_tool = DuckDuckGoSearchRun()
 
 
-def planner_node(state: AgentState) -> Dict[str, Any]:
+def tavily_search(query: str) -> List[Dict[str, Any]]:
+    api_key = os.getenv("TAVILY_API_KEY")
+    if not api_key:
+        raise RuntimeError("TAVILY_API_KEY 未配置，无法使用 Tavily。")
+
+    client = TavilyClient(api_key=api_key)
+    resp = client.search(
+        query,
+        max_results=6,
+        search_depth="basic",
+        include_answer=False,
+        include_raw_content=False,
+    )
+    return resp.get("results", []) if isinstance(resp, dict) else []
+
+
+# Primary search backend: query -> list of {"title", "url", "content"} results.
+search_provider = tavily_search
+
+
+def configure(chat_model=None, search=None, models=None, routes=None):
+    """Swap the chat model(s) and/or search backend process-wide, e.g. for offline benchmarks.
+
+    `chat_model` serves every node. `models` ({name: chat model}) with `routes` ({node:
+    [name, fallback, ...]}, see MODEL_ROUTES) sets up per-node routing instead.
+    `search` is called as search(query) -> results and must also provide run(query) -> str,
+    which replaces the DuckDuckGo fallback.
+    """
+    global llm, router, search_provider, search_tool
+    if models is not None:
+        router = ModelRouter(models, routes or {"default": list(models)}, timeout=LLM_TIMEOUT)
+        llm = models[router.route("default")[0]]
+    elif chat_model is not None:
+        llm = chat_model
+        name = metrics.model_name(chat_model)
+        router = ModelRouter({name: chat_model}, {"default": [name]}, timeout=LLM_TIMEOUT)
+    if search is not None:
+        search_provider = search
+        search_tool = search
+
+
+# Identical LLM prompts and search queries issued concurrently (e.g. several threads on the
+# same hot topic) share one upstream call; SINGLE_FLIGHT=0 turns this off.
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") != "0"
+
+
+def _coalesced(flight, key, fn):
+    # Runs that share a CallCache (one /batch) also reuse each other's finished results.
+    cache = current_cache.get()
+    if cache is not None:
+        hit, value = cache.get(key)
+        if hit:
+            return value
+    value = flight.do(key, fn) if SINGLE_FLIGHT else fn()
+    if cache is not None:
+        cache.put(key, value)
+    return value
+
+
+def _llm_key(active, node, messages) -> tuple:
+    return (id(active), tuple(active.route(node)), prompt_key(messages))
+
+
+def invoke_llm(messages):
+    """Single entry point for chat-model calls, so each one is routed, timed and attributed."""
+    active = router
+    node = metrics.current_node.get() or "default"
+
+    def call_model(model, attempt):
+        # Metrics count each upstream attempt once, in the thread that made it.
+        with metrics.registry.llm_call(model, messages) as call:
+            call["response"] = model.invoke(messages)
+        return call["response"]
+
+    with recorder.llm_call(active.models[active.route(node)[0]], messages) as recorded:
+        name, response = _coalesced(llm_calls, _llm_key(active, node, messages), lambda: active.call(node, call_model))
+        recorded["model"], recorded["response"] = active.models[name], response
+    return response
+
+
+def stream_llm(messages, on_text=None):
+    """Like invoke_llm, but streams the reply, passing each text delta to on_text as it arrives.
+
+    A caller served by an identical call already in flight (or cached) gets the whole reply as
+    one delta. Once a model has streamed output, it is no longer replaced by its fallbacks.
+    """
+    active = router
+    node = metrics.current_node.get() or "default"
+    delivered = []
+
+    def deliver(text):
+        delivered.append(text)
+        on_text(text)
+
+    def call_model(model, attempt):
+        with metrics.registry.llm_call(model, messages) as call:
+            response = None
+            for chunk in model.stream(messages):
+                response = chunk if response is None else response + chunk
+                if on_text is not None:
+                    attempt.emit(deliver, chunk.content)
+            call["response"] = response if response is not None else AIMessage(content="")
+        return call["response"]
+
+    with recorder.llm_call(active.models[active.route(node)[0]], messages) as recorded:
+        name, response = _coalesced(llm_calls, _llm_key(active, node, messages), lambda: active.call(node, call_model))
+        recorded["model"], recorded["response"] = active.models[name], response
+    if not delivered and on_text is not None and response.content:
+        on_text(response.content)
+    return response
+
+
+def run_search(query: str) -> List[Dict[str, Any]]:
+    provider = search_provider
+    name = getattr(provider, "provider", "tavily")
+
+    def call_provider():
+        with metrics.registry.search_call(name, query):
+            return provider(query)
+
+    with recorder.search_call("search", query) as recorded:
+        recorded["result"] = _coalesced(search_calls, ("search", name, query), call_provider)
+    return recorded["result"]
+
+
+def run_text_search(query: str) -> str:
+    """The text-only fallback search (DuckDuckGo unless configured otherwise)."""
+    tool = search_tool
+    name = getattr(tool, "provider", "duckduckgo")
+
+    def call_tool():
+        with metrics.registry.search_call(name, query):
+            return tool.run(query)
+
+    with recorder.search_call("search_text", query) as recorded:
+        recorded["result"] = _coalesced(search_calls, ("search_text", name, query), call_tool)
+    return recorded["result"]
+
+
+# A plan step counts as covered when this share of it already appears in the corpus.
+CORPUS_COVERAGE_THRESHOLD = float(os.getenv("CORPUS_COVERAGE_THRESHOLD", "0.6"))
+
+
+def is_covered(step: str, chunks: List[str]) -> bool:
+    return any(overlap_score(step, c) >= CORPUS_COVERAGE_THRESHOLD for c in chunks)
+
+
+# Speculative research: searches the planner starts for plan steps while the plan is still
+# streaming. Keyed by (thread_id, step); consumed by researcher_node / section_pipeline_node.
+SPECULATIVE_RESEARCH = os.getenv("SPECULATIVE_RESEARCH", "1") != "0"
+# Shared by all runs; pipelined mode prefetches every section of every run, so this is sized
+# for several concurrent runs. A prefetch still queued when its step is needed is run inline.
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "32"))
+MAX_PENDING_PREFETCHES = 256
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_prefetches: "OrderedDict[tuple, Any]" = OrderedDict()
+_prefetch_lock = threading.Lock()
+
+
+def _start_prefetch(thread_id: str, step: str):
+    with _prefetch_lock:
+        if (thread_id, step) in _prefetches:
+            return
+        # copy_context: the search is timed and recorded as the planner's, for this thread.
+        future = _prefetch_pool.submit(contextvars.copy_context().run, search_evidence, step)
+        _prefetches[(thread_id, step)] = future
+        while len(_prefetches) > MAX_PENDING_PREFETCHES:
+            _, stale = _prefetches.popitem(last=False)
+            stale.cancel()
+
+
+def _drop_prefetches(thread_id: str, keep: List[str]):
+    """Reconcile with the final plan: cancel searches for steps that did not survive."""
+    with _prefetch_lock:
+        for key in [k for k in _prefetches if k[0] == thread_id and k[1] not in keep]:
+            _prefetches.pop(key).cancel()
+            print(f"Dropped speculative search: {key[1]}")
+
+
+def take_prefetched(step: str):
+    """(research chunk, sources) if the planner already searched (or is searching) this step for
+    the current thread; None means the caller should search itself."""
+    with _prefetch_lock:
+        future = _prefetches.pop((metrics.current_thread.get(), step), None)
+    if future is None or future.cancelled():
+        return None
+    if future.cancel():
+        # Still queued behind other prefetches: searching now beats waiting for a worker.
+        return None
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"Speculative search failed: {e}")
+        return None
+
+
+def planner_node(state: AgentState, prefetch: Optional[int] = None) -> Dict[str, Any]:
+    """Plan the report; with `prefetch`, search up to that many steps (None: all) while the plan streams."""
     print("--- PLANNER NODE ---")
     task = state["task"]
     history_context = state.get("history_context", "")
@@ -41,8 +271,27 @@ def planner_node(state: AgentState) -> Dict[str, Any]:
     else:
         user_msg = HumanMessage(content=f"任务：{task}")
 
+    thread_id = metrics.current_thread.get()
+    corpus = [c for c in state.get("research_chunks", []) if isinstance(c, str) and c.strip()]
+    speculate = SPECULATIVE_RESEARCH and prefetch != 0 and bool(thread_id)
+    parser = PlanStepParser()
+    started: List[str] = []
+
+    def on_text(text: str):
+        for step in parser.feed(text):
+            step = step.strip()
+            if prefetch is not None and len(started) >= prefetch:
+                return
+            # Followups may already hold evidence for this step; the router would skip it too.
+            if not is_covered(step, corpus):
+                started.append(step)
+                _start_prefetch(thread_id, step)
+
     try:
-        response = llm.invoke([system_msg, user_msg])
+        if speculate:
+            response = stream_llm([system_msg, user_msg], on_text)
+        else:
+            response = invoke_llm([system_msg, user_msg])
         content = response.content.replace("```json", "").replace("```", "").strip()
         plan_data = json.loads(content)
         plan = plan_data.get("plan", [])
@@ -50,6 +299,9 @@ def planner_node(state: AgentState) -> Dict[str, Any]:
         print(f"Planner Error: {e}")
         plan = [f"梳理 {task} 的现状与范围", "识别关键趋势与驱动因素", "总结核心结论与建议"]
 
+    if started:
+        _drop_prefetches(thread_id, [str(p).strip() for p in plan] if isinstance(plan, list) else [])
+
     return {"plan": plan, "messages": [SystemMessage(content=f"Plan generated: {plan}")]}
 
 
@@ -67,37 +319,23 @@ def research_router_node(state: AgentState) -> Dict[str, Any]:
             tasks = [focus]
     if not tasks and plan:
         tasks = plan[:3]
+        # Follow-ups start with the stored corpus; only search the steps it does not cover.
+        chunks = [c for c in state.get("research_chunks", []) if isinstance(c, str) and c.strip()]
+        if chunks:
+            tasks = [t for t in tasks if not is_covered(t, chunks)]
+            if not tasks:
+                return {"research_tasks": [], "research_task": ""}
     if not tasks:
         tasks = [task]
 
     return {"research_tasks": tasks, "research_task": tasks[0]}
 
 
-def researcher_node(state: AgentState) -> Dict[str, Any]:
-    print("--- RESEARCHER NODE ---")
-    plan = state.get("plan", [])
-    task = state.get("task", "")
-
-    research_task = state.get("research_task", "").strip()
-    search_query = research_task if research_task else f"{task} {plan[0] if plan else ''}".strip()
-    print(f"Searching for: {search_query}")
-
+def search_evidence(query: str):
+    """(research chunk, sources) for one query: the search provider first, then the text fallback."""
     sources = []
-    search_result = ""
     try:
-        api_key = os.getenv("TAVILY_API_KEY")
-        if not api_key:
-            raise RuntimeError("TAVILY_API_KEY 未配置，无法使用 Tavily。")
-
-        client = TavilyClient(api_key=api_key)
-        resp = client.search(
-            search_query,
-            max_results=6,
-            search_depth="basic",
-            include_answer=False,
-            include_raw_content=False,
-        )
-        results = resp.get("results", []) if isinstance(resp, dict) else []
+        results = run_search(query)
         summary_lines = []
         for r in results:
             title = r.get("title") or "无标题"
@@ -115,10 +353,26 @@ def researcher_node(state: AgentState) -> Dict[str, Any]:
     except Exception as e:
         print(f"Tavily Search Error: {e}")
         try:
-            search_result = search_tool.run(search_query)
+            search_result = run_text_search(query)
         except Exception as e2:
             print(f"Search Fallback Error: {e2}")
             search_result = "检索失败，暂时依赖模型内部知识。"
+    return search_result, sources
+
+
+def researcher_node(state: AgentState) -> Dict[str, Any]:
+    print("--- RESEARCHER NODE ---")
+    plan = state.get("plan", [])
+    task = state.get("task", "")
+
+    research_task = state.get("research_task", "").strip()
+    if not research_task and state.get("research_chunks"):
+        print("Existing corpus covers the plan, skipping search.")
+        return {"messages": [SystemMessage(content="Research skipped: existing corpus covers the plan")]}
+    search_query = research_task if research_task else f"{task} {plan[0] if plan else ''}".strip()
+    print(f"Searching for: {search_query}")
+
+    search_result, sources = take_prefetched(search_query) or search_evidence(search_query)
 
     return {
         "research_chunks": [search_result],
@@ -127,102 +381,526 @@ def researcher_node(state: AgentState) -> Dict[str, Any]:
     }
 
 
+# Snippets at least this similar (estimated Jaccard of 5-character shingles) count as copies
+# of one another during merge; 1 or more turns deduplication off.
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.8"))
+
+
+def _attribution(source: Dict[str, Any]) -> tuple:
+    title = source.get("title") or ""
+    return (bool(source.get("url")), bool(title) and title != "无标题", len(source.get("snippet") or ""))
+
+
+def dedupe_corpus(chunks: List[str], sources) -> tuple:
+    """(chunks without near-duplicate snippets, snippets seen, snippets dropped).
+
+    Search chunks are "- title：snippet" lists; any other chunk (the text-search fallback)
+    is one snippet. Of each group of copies, the one whose source has a URL and a real
+    title, then the longest snippet, is kept where it appeared.
+    """
+    attribution = {}
+    for source in sources or []:
+        title = source.get("title") or "无标题"
+        attribution[title] = max(attribution.get(title, (False, False, 0)), _attribution(source))
+
+    items = []  # (text compared, attribution) per snippet, in corpus order
+    layout = []  # per chunk: its lines, with list lines replaced by their item index
+    for chunk in chunks:
+        lines = chunk.splitlines()
+        if not any(line.startswith("- ") for line in lines):
+            layout.append([len(items)])
+            items.append((chunk, (False, False, len(chunk))))
+            continue
+        entries = []
+        for line in lines:
+            if line.startswith("- "):
+                title, _, snippet = line[2:].partition("：")
+                entries.append(len(items))
+                items.append((snippet or title, attribution.get(title, (False, False, len(snippet)))))
+            else:
+                entries.append(line)
+        layout.append(entries)
+
+    groups = near_duplicate_groups([item[0] for item in items], DEDUP_SIMILARITY)
+    kept = {max(group, key=lambda i: (items[i][1], -i)) for group in groups}
+
+    merged = []
+    for chunk, entries in zip(chunks, layout):
+        if not any(isinstance(e, int) and e in kept for e in entries):
+            continue
+        if entries == [entries[0]] and isinstance(entries[0], int):
+            merged.append(chunk)
+            continue
+        lines = chunk.splitlines()
+        merged.append("\n".join(line for line, e in zip(lines, entries) if not isinstance(e, int) or e in kept))
+    return merged, len(items), len(items) - len(kept)
+
+
 def research_merge_node(state: AgentState) -> Dict[str, Any]:
     print("--- RESEARCH MERGE NODE ---")
-    chunks = state.get("research_chunks", [])
-    content = "\n\n".join([c for c in chunks if isinstance(c, str) and c.strip()])
+    chunks = corpus_chunks(state)
+    merged = chunks
+    if chunks and DEDUP_SIMILARITY < 1:
+        merged, seen, dropped = dedupe_corpus(chunks, state.get("sources", []))
+        metrics.registry.record_dedup(seen, dropped)
+        if dropped:
+            print(f"Dropped {dropped}/{seen} near-duplicate snippets")
+    content = "\n\n".join(merged)
     if not content:
         content = "未检索到有效资料。"
-    return {"content": content}
+    return {"content": content, "merged_chunks": merged, "merged_from": len(chunks)}
+
+
+# RESEARCH_DIGEST=on adds a stage after research_merge that condenses the corpus into a
+# deduplicated fact sheet; writer prompts then carry the digest instead of the raw chunks.
+RESEARCH_DIGEST = os.getenv("RESEARCH_DIGEST", "off") == "on"
+DIGEST_MAX_FACTS = 40
+DIGEST_MAX_CHARS = 4000
+MAX_CACHED_DIGESTS = 64
+_digests: "OrderedDict[str, str]" = OrderedDict()
+_digest_lock = threading.Lock()
+
+
+def corpus_chunks(state) -> List[str]:
+    return [c for c in state.get("research_chunks", []) if isinstance(c, str) and c.strip()]
+
+
+def merged_corpus(state) -> List[str]:
+    """The deduplicated corpus from research_merge while it is current, else the raw chunks."""
+    chunks = corpus_chunks(state)
+    if state.get("merged_chunks") and state.get("merged_from") == len(chunks):
+        return state["merged_chunks"]
+    return chunks
+
+
+def corpus_key(chunks: List[str]) -> str:
+    return hashlib.sha1(json.dumps(chunks, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def source_legend(sources) -> str:
+    """Unique sources numbered [S1], [S2], ... as cited by the digest."""
+    seen, lines = set(), []
+    for s in sources or []:
+        ident = s.get("url") or s.get("title")
+        if not ident or ident in seen:
+            continue
+        seen.add(ident)
+        title = s.get("title") or "无标题"
+        url = s.get("url") or ""
+        lines.append(f"[S{len(lines) + 1}] {title} - {url}" if url else f"[S{len(lines) + 1}] {title}")
+    return "\n".join(lines) or "无"
+
+
+def research_digest_node(state: AgentState) -> Dict[str, Any]:
+    print("--- RESEARCH DIGEST NODE ---")
+    chunks = merged_corpus(state)
+    if not chunks:
+        return {}
+    key = corpus_key(chunks)
+    if state.get("digest_corpus") == key:
+        print("Corpus unchanged, keeping the current digest.")
+        return {}
+    with _digest_lock:
+        digest = _digests.get(key)
+        if digest is not None:
+            _digests.move_to_end(key)
+    if digest is None:
+        legend = source_legend(state.get("sources", []))
+        prompt = DIGEST_PROMPT_TEMPLATE.format(
+            task=state.get("task", ""),
+            plan="\n".join(plan_sections(state.get("plan", []))),
+            sources=legend,
+            content="\n\n".join(chunks),
+            max_facts=DIGEST_MAX_FACTS,
+        )
+        try:
+            facts = invoke_llm([HumanMessage(content=prompt)]).content.strip()
+        except Exception as e:
+            # Without a digest for this corpus the writers fall back to the raw chunks.
+            print(f"Digest Error: {e}")
+            return {}
+        if not facts:
+            return {}
+        digest = f"{facts[:DIGEST_MAX_CHARS]}\n\n来源编号：\n{legend}"
+        with _digest_lock:
+            _digests[key] = digest
+            while len(_digests) > MAX_CACHED_DIGESTS:
+                _digests.popitem(last=False)
+    return {"research_digest": digest, "digest_corpus": key}
+
+
+def research_evidence(state) -> str:
+    """Research material for writer prompts: the digest when it matches the corpus, else the chunks."""
+    chunks = merged_corpus(state)
+    digest = state.get("research_digest")
+    if digest and chunks and state.get("digest_corpus") == corpus_key(chunks):
+        return digest
+    return "\n\n".join(chunks) or "未检索到有效资料。"
+
+
+def format_sources(sources) -> str:
+    if not sources:
+        return "无"
+    lines = []
+    for idx, s in enumerate(sources[:8], start=1):
+        title = s.get("title") or "无标题"
+        url = s.get("url") or ""
+        if url:
+            lines.append(f"{idx}. {title} - {url}")
+        else:
+            lines.append(f"{idx}. {title}")
+    return "\n".join(lines)
+
+
+def plan_sections(plan) -> List[str]:
+    if isinstance(plan, list):
+        plan_items = [str(p).strip() for p in plan if str(p).strip()]
+    else:
+        plan_items = [str(plan).strip()] if plan else []
+    return plan_items or ["背景与现状", "关键发现", "影响与建议", "结论"]
+
+
+def write_section(task, section, content, critique, sources_text, human_feedback, history_context) -> str:
+    section_prompt = SECTION_WRITER_PROMPT_TEMPLATE.format(
+        task=task,
+        section=section,
+        content=content,
+        critique=critique,
+        sources=sources_text,
+        human_feedback=human_feedback,
+        history_context=history_context
+    )
+    with metrics.section(section):
+        response = invoke_llm([HumanMessage(content=section_prompt)])
+    section_body = response.content.strip()
+    if not section_body:
+        section_body = "本节内容生成失败，请稍后重试。"
+    return f"## {section}\n{section_body}"
+
+
+def integrate_sections(task, plan_items, sections, critique, sources_text, human_feedback, history_context) -> str:
+    final_prompt = FINAL_WRITER_PROMPT_TEMPLATE.format(
+        task=task,
+        plan=plan_items,
+        sections="\n\n".join(sections),
+        critique=critique,
+        sources=sources_text,
+        human_feedback=human_feedback,
+        history_context=history_context
+    )
+    return invoke_llm([HumanMessage(content=final_prompt)]).content
+
+
+# "full": one more LLM call integrates the section drafts into the report (original behavior).
+# "local": the report is assembled here from the drafts plus short intro/conclusion calls that
+# run alongside the sections, and a reference list built from `sources`.
+# "auto": "local" once the plan has ASSEMBLY_AUTO_SECTIONS sections or more, else "full".
+ASSEMBLY_MODE = os.getenv("ASSEMBLY_MODE", "full")
+ASSEMBLY_AUTO_SECTIONS = int(os.getenv("ASSEMBLY_AUTO_SECTIONS", "4"))
+FRAME_PARTS = {"引言": INTRO_PROMPT_TEMPLATE, "结论": CONCLUSION_PROMPT_TEMPLATE}
+FRAME_EVIDENCE_CHARS = 3000
+_frame_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="frame")
+
+
+def frame_parts(plan_items: List[str]) -> List[str]:
+    """Intro/conclusion parts local assembly adds, minus any the plan already has as a section."""
+    return [part for part in FRAME_PARTS if part not in plan_items]
+
+
+def resolve_assembly_mode(plan_items: List[str]) -> str:
+    if ASSEMBLY_MODE == "auto":
+        return "local" if len(plan_items) >= ASSEMBLY_AUTO_SECTIONS else "full"
+    return "local" if ASSEMBLY_MODE == "local" else "full"
+
+
+def write_frame(part, task, plan_items, content, critique, human_feedback, history_context) -> str:
+    prompt = FRAME_PARTS[part].format(
+        task=task,
+        plan="\n".join(plan_items),
+        content=content[:FRAME_EVIDENCE_CHARS],
+        critique=critique,
+        human_feedback=human_feedback,
+        history_context=history_context
+    )
+    with metrics.section(part):
+        response = invoke_llm([HumanMessage(content=prompt)])
+    return f"## {part}\n{response.content.strip()}"
+
+
+def submit_frames(parts, *args) -> Dict[str, Any]:
+    """Start intro/conclusion calls in the background; {part: future}."""
+    return {
+        part: _frame_pool.submit(contextvars.copy_context().run, write_frame, part, *args)
+        for part in parts
+    }
+
+
+def format_references(sources, limit: int = 8) -> str:
+    seen, unique = set(), []
+    for s in sources or []:
+        ident = s.get("url") or s.get("title")
+        if ident and ident not in seen:
+            seen.add(ident)
+            unique.append(s)
+    return format_sources(unique[:limit]) if unique else "暂无可引用的来源。"
+
+
+_HEADING = re.compile(r"^##\s*(?:步骤\s*\d+|step\s*\d+|\d+[.、])?\s*[:：]?\s*", re.IGNORECASE)
+
+
+def assemble_report(task, plan_items, parts: Dict[str, str], sources) -> str:
+    """Local assembly: intro, numbered sections, conclusion and a reference list, no LLM call."""
+    # A plan step titled like a frame part (e.g. "结论") is emitted once, as a numbered section.
+    frames = frame_parts(plan_items)
+    blocks = [parts["引言"]] if "引言" in frames and parts.get("引言") else []
+    for idx, section in enumerate(plan_items, start=1):
+        text = parts.get(section) or f"## {section}\n本节内容生成失败，请稍后重试。"
+        blocks.append(_HEADING.sub(f"## {idx}. ", text, count=1))
+    if "结论" in frames and parts.get("结论"):
+        blocks.append(parts["结论"])
+    blocks.append("## 参考来源\n" + format_references(sources))
+    return f"# {task}\n\n" + "\n\n".join(blocks)
+
+
+def _draft_update(draft: str, revision_number: int) -> Dict[str, Any]:
+    return {
+        "content": draft,
+        "revision_number": revision_number + 1,
+        "revised_parts": [],
+        "human_action": "",
+        "messages": [HumanMessage(content=f"Draft written (Rev {revision_number+1})")]
+    }
+
+
+def section_key(*parts) -> str:
+    """Hash of everything a section draft was written from; the key into state["draft_cache"]."""
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
 
 
 def writer_node(state: AgentState) -> Dict[str, Any]:
     print("--- WRITER NODE ---")
     task = state["task"]
     plan = state["plan"]
-    content = state["content"]
     critique = state.get("critique", "")
     human_feedback = state.get("human_feedback", "")
-    history_context = state.get("history_context", "")
     revision_number = state.get("revision_number", 0)
     sources = state.get("sources", [])
     history_context = state.get("history_context", "")
 
-    sources_text = ""
-    if sources:
-        lines = []
-        for idx, s in enumerate(sources[:8], start=1):
-            title = s.get("title") or "无标题"
-            url = s.get("url") or ""
-            if url:
-                lines.append(f"{idx}. {title} - {url}")
-            else:
-                lines.append(f"{idx}. {title}")
-        sources_text = "\n".join(lines)
-    else:
-        sources_text = "无"
+    sources_text = format_sources(sources)
+    chunks = corpus_chunks(state)
+    # Every writer prompt, the fallback included, reads the research corpus (or its digest), not
+    # state["content"], which holds the previous draft on revisions; that also keeps unchanged
+    # sections' inputs (and keys) stable.
+    evidence = research_evidence(state)
+    draft_cache = state.get("draft_cache") or {}
+    current = state.get("section_drafts") or {}
+    # Drafts are reusable only while the corpus they were written from is unchanged.
+    corpus_unchanged = state.get("draft_corpus") == len(chunks)
+    new_feedback = human_feedback if state.get("human_action") == "reject" else ""
 
     try:
-        if isinstance(plan, list):
-            plan_items = [str(p).strip() for p in plan if str(p).strip()]
+        plan_items = plan_sections(plan)
+        assembly = resolve_assembly_mode(plan_items)
+        frames_needed = frame_parts(plan_items) if assembly == "local" else []
+        parts = plan_items + frames_needed
+        notes = [n for n in (critique, new_feedback) if n]
+        targets = set(parts)
+        if notes:
+            targets = set().union(*(targeted_sections(n, parts) for n in notes))
+
+        keys, jobs = {}, {}
+        for part in parts:
+            previous = current.get(part) if corpus_unchanged else None
+            if previous in draft_cache and part not in targets:
+                keys[part] = previous
+                continue
+            key = section_key(part, evidence, critique, new_feedback, history_context, previous or "")
+            keys[part] = key
+            if key not in draft_cache:
+                jobs[key] = part
+
+        # Intro and conclusion do not depend on the section drafts, so they run alongside them.
+        frames = submit_frames(
+            [p for p in jobs.values() if p in frames_needed],
+            task, plan_items, evidence, critique, human_feedback, history_context
+        )
+        cache_update = {
+            key: write_section(task, part, evidence, critique, sources_text, human_feedback, history_context)
+            for key, part in jobs.items() if part not in frames_needed
+        }
+        cache_update.update({key: frames[part].result() for key, part in jobs.items() if part in frames_needed})
+        print(f"Parts rewritten: {len(jobs)}/{len(parts)} ({assembly} assembly)")
+
+        texts = {part: cache_update.get(key) or draft_cache[key] for part, key in keys.items()}
+        if assembly == "local":
+            draft = assemble_report(task, plan_items, texts, sources)
         else:
-            plan_items = [str(plan).strip()] if plan else []
-        if not plan_items:
-            plan_items = ["背景与现状", "关键发现", "影响与建议", "结论"]
-
-        sections = []
-        for section in plan_items:
-            section_prompt = SECTION_WRITER_PROMPT_TEMPLATE.format(
-                task=task,
-                section=section,
-                content=content,
-                critique=critique,
-                sources=sources_text,
-                human_feedback=human_feedback,
-                history_context=history_context
+            draft = integrate_sections(
+                task, plan_items, [texts[s] for s in plan_items], critique, sources_text, human_feedback, history_context
             )
-            response = llm.invoke([HumanMessage(content=section_prompt)])
-            section_body = response.content.strip()
-            if not section_body:
-                section_body = "本节内容生成失败，请稍后重试。"
-            sections.append(f"## {section}\n{section_body}")
-
-        sections_text = "\n\n".join(sections)
-        final_prompt = FINAL_WRITER_PROMPT_TEMPLATE.format(
-            task=task,
-            plan=plan_items,
-            sections=sections_text,
-            critique=critique,
-            sources=sources_text,
-            human_feedback=human_feedback,
-            history_context=history_context
-        )
-        response = llm.invoke([HumanMessage(content=final_prompt)])
-        draft = response.content
+        drafts_update = {part: key for part, key in keys.items() if current.get(part) != key}
     except Exception as e:
         print(f"Writer Error: {e}")
         try:
             fallback_prompt = WRITER_PROMPT_TEMPLATE.format(
                 task=task,
                 plan=plan,
-                content=content,
+                content=evidence,
                 critique=critique,
                 sources=sources_text,
                 human_feedback=human_feedback,
                 history_context=history_context
             )
-            response = llm.invoke([HumanMessage(content=fallback_prompt)])
+            response = invoke_llm([HumanMessage(content=fallback_prompt)])
             draft = response.content
         except Exception as e2:
             print(f"Writer Fallback Error: {e2}")
             draft = "生成失败，请稍后重试。"
+        return _draft_update(draft, revision_number)
 
-    return {
-        "content": draft,
-        "revision_number": revision_number + 1,
-        "human_action": "",
-        "messages": [HumanMessage(content=f"Draft written (Rev {revision_number+1})")]
-    }
+    update = _draft_update(draft, revision_number)
+    update.update(draft_cache=cache_update, section_drafts=drafts_update, draft_corpus=len(chunks))
+    if len(jobs) < len(parts):
+        update["revised_parts"] = list(jobs.values())
+    return update
+
+
+def section_pipeline_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Research and draft one plan section on its own (pipelined mode; input comes from a Send)."""
+    task = state["task"]
+    section = state["section"]
+    print(f"--- SECTION PIPELINE: {section} ---")
+    corpus = [c for c in state.get("research_chunks", []) if isinstance(c, str) and c.strip()]
+
+    update: Dict[str, Any] = {"research_chunks": [], "sources": []}
+    evidence = select_relevant(section, corpus, k=2)
+    if not is_covered(section, corpus):
+        search_result, sources = take_prefetched(section) or search_evidence(section)
+        update = {"research_chunks": [search_result], "sources": sources}
+        evidence.append(search_result)
+
+    evidence_text = "\n\n".join(evidence) or "未检索到有效资料。"
+    key = section_key(section, evidence_text, "", "", state.get("history_context", ""), "")
+    try:
+        draft = write_section(
+            task,
+            section,
+            evidence_text,
+            state.get("critique", ""),
+            format_sources(update["sources"]),
+            state.get("human_feedback", ""),
+            state.get("history_context", ""),
+        )
+        update["draft_cache"] = {key: draft}
+        update["section_drafts"] = {section: key}
+    except Exception as e:
+        # Left out of the cache, so the next writer pass drafts this section again.
+        print(f"Section Writer Error: {e}")
+    update["messages"] = [SystemMessage(content=f"Section drafted: {section}")]
+    return update
+
+
+def report_frame_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Intro and conclusion for local assembly, written in parallel with the section branches."""
+    print("--- REPORT FRAME NODE ---")
+    plan_items = state["plan_items"]
+    evidence = research_evidence(state)
+    history_context = state.get("history_context", "")
+    frames = submit_frames(
+        frame_parts(plan_items), state["task"], plan_items, evidence,
+        state.get("critique", ""), state.get("human_feedback", ""), history_context
+    )
+    update: Dict[str, Any] = {"draft_cache": {}, "section_drafts": {}}
+    for part, future in frames.items():
+        try:
+            text = future.result()
+        except Exception as e:
+            print(f"Report Frame Error ({part}): {e}")
+            continue
+        key = section_key(part, evidence, "", "", history_context, "")
+        update["draft_cache"][key] = text
+        update["section_drafts"][part] = key
+    return update
+
+
+def integrator_node(state: AgentState) -> Dict[str, Any]:
+    print("--- INTEGRATOR NODE ---")
+    task = state["task"]
+    critique = state.get("critique", "")
+    human_feedback = state.get("human_feedback", "")
+    history_context = state.get("history_context", "")
+    revision_number = state.get("revision_number", 0)
+    sources_text = format_sources(state.get("sources", []))
+
+    plan_items = plan_sections(state.get("plan", []))
+    drafts = state.get("section_drafts") or {}
+    draft_cache = state.get("draft_cache") or {}
+    sections = [
+        draft_cache.get(drafts.get(section)) or f"## {section}\n本节内容生成失败，请稍后重试。"
+        for section in plan_items
+    ]
+    try:
+        if resolve_assembly_mode(plan_items) == "local":
+            parts = {part: draft_cache.get(drafts.get(part)) for part in frame_parts(plan_items) + plan_items}
+            draft = assemble_report(task, plan_items, parts, state.get("sources", []))
+        else:
+            draft = integrate_sections(
+                task, plan_items, sections, critique, sources_text, human_feedback, history_context
+            )
+    except Exception as e:
+        print(f"Integrator Error: {e}")
+        draft = f"# {task}\n\n" + "\n\n".join(sections)
+
+    update = _draft_update(draft, revision_number)
+    # Every branch has merged its research by now; these drafts match the full corpus.
+    update["draft_corpus"] = len([c for c in state.get("research_chunks", []) if isinstance(c, str) and c.strip()])
+    return update
+
+
+# Local pre-screen thresholds: drafts failing these are sent back without an LLM review.
+MIN_REPORT_CHARS = int(os.getenv("MIN_REPORT_CHARS", "600"))
+MIN_CITED_SOURCES = 3
+SECTION_PRESENCE_THRESHOLD = 0.4
+# The revision loop stops early (and goes to human review) once a rewrite leaves the draft
+# this similar to the previous one, or the reviewer repeats its last critique this closely.
+CONVERGENCE_SIMILARITY = float(os.getenv("CONVERGENCE_SIMILARITY", "0.9"))
+CRITIQUE_REPEAT_SIMILARITY = 0.8
+
+
+def prescreen_report(content: str, plan_items: List[str], sources) -> List[str]:
+    """Clear, mechanical problems with a draft; an empty list means it goes to the LLM reviewer."""
+    issues = []
+    if len(content.strip()) < MIN_REPORT_CHARS:
+        issues.append(f"全文仅 {len(content.strip())} 字，篇幅明显不足，请充实各章节内容")
+    missing = [step for step in plan_items if overlap_score(step, content) < SECTION_PRESENCE_THRESHOLD]
+    if missing:
+        issues.append("缺少以下章节：" + "、".join(f"「{step}」" for step in missing))
+    if "参考来源" not in content:
+        issues.append("缺少“参考来源”章节")
+    urls = {s.get("url") for s in sources or [] if s.get("url")}
+    cited = sum(1 for url in urls if url in content)
+    if cited < min(MIN_CITED_SOURCES, len(urls)):
+        issues.append(f"参考来源仅引用了 {cited} 条检索到的来源，请补充标题与 URL")
+    return issues
+
+
+def revision_similarity(signature: Dict[str, List[int]], previous, revised_parts: List[str]) -> float:
+    """Similarity of a draft to the one last reviewed, over the parts the writer rewrote.
+
+    A targeted rewrite leaves the other sections untouched, so on the whole draft even a
+    thorough fix of one part in seven still scores ~0.9. Falls back to the whole draft when
+    every part was rewritten or the rewritten parts cannot be found by heading.
+    """
+    if not isinstance(previous, dict) or not previous:
+        return 0.0
+    # Match on titles without step numbering; local assembly renumbers headings.
+    titles = [_HEADING.sub("", f"## {part}", count=1).strip() for part in revised_parts]
+    headings = [h for h in signature if h.startswith("## ")]
+    scope = [h for h in headings if any(title and title in h for title in titles)]
+    if not scope:
+        return signature_similarity(signature[""], previous.get("", []))
+    return sum(signature_similarity(signature[h], previous.get(h, [])) for h in scope) / len(scope)
 
 
 def reviewer_node(state: AgentState) -> Dict[str, Any]:
@@ -231,13 +909,37 @@ def reviewer_node(state: AgentState) -> Dict[str, Any]:
     revision_number = state.get("revision_number", 0)
     max_revisions = state.get("max_revisions", 2)
 
+    issues = prescreen_report(content, plan_sections(state.get("plan", [])), state.get("sources", []))
+    sections = split_sections(content)
+    signature = {"": draft_signature(content)}
+    signature.update({section.splitlines()[0]: draft_signature(section) for section in sections})
     if revision_number >= max_revisions:
-        return {"critique": "APPROVE"}
-
-    prompt = REVIEWER_PROMPT_TEMPLATE.format(content=content)
+        # Out of revisions: let the human reviewer see whatever the pre-screen still flags.
+        return _stop_review("max_revisions", issues, signature)
+    similarity = revision_similarity(signature, state.get("review_signature"), state.get("revised_parts") or [])
+    if similarity >= CONVERGENCE_SIMILARITY:
+        # The last rewrite barely changed anything; another round would cost the same and do as little.
+        print(f"Draft converged (similarity {similarity:.2f})")
+        return _stop_review("draft_converged", issues, signature)
+    if issues:
+        print(f"Pre-screen failed: {issues}")
+        return {"critique": "REVISE: " + "；".join(issues), "review_notes": "", "review_signature": signature, "stop_reason": ""}
+
+    # Later rounds only show the LLM what changed since the draft it last reviewed.
+    fingerprints = {section.splitlines()[0]: section_key(section) for section in sections}
+    reviewed = state.get("reviewed_sections") or {}
+    changed = [s for s in sections if reviewed.get(s.splitlines()[0]) != fingerprints[s.splitlines()[0]]]
+    if reviewed and changed and len(changed) < len(sections):
+        prompt = REVIEWER_DIFF_PROMPT_TEMPLATE.format(
+            critique=state.get("critique", ""),
+            outline="\n".join(fingerprints),
+            changes="\n\n".join(changed),
+        )
+    else:
+        prompt = REVIEWER_PROMPT_TEMPLATE.format(content=content)
 
     try:
-        response = llm.invoke([HumanMessage(content=prompt)])
+        response = invoke_llm([HumanMessage(content=prompt)])
         result = response.content.strip()
     except Exception as e:
         print(f"Reviewer Error: {e}")
@@ -260,7 +962,26 @@ def reviewer_node(state: AgentState) -> Dict[str, Any]:
         normalized = f"REVISE: {lines[0]}"
     result = normalized if normalized else "REVISE: 请补充关键数据来源并优化结构。"
 
-    return {"critique": result}
+    if result == "APPROVE":
+        return {"critique": result, "reviewed_sections": fingerprints, "review_notes": "", "review_signature": signature, "stop_reason": "approved"}
+    previous = state.get("critique", "")
+    if previous != "APPROVE" and text_similarity(result, previous) >= CRITIQUE_REPEAT_SIMILARITY:
+        # The writer did not manage to address this critique last round either.
+        print(f"Critique repeated: {result}")
+        update = _stop_review("critique_repeated", [result.split(":", 1)[-1].strip()], signature)
+        update["reviewed_sections"] = fingerprints
+        return update
+    return {"critique": result, "reviewed_sections": fingerprints, "review_notes": "", "review_signature": signature, "stop_reason": ""}
+
+
+def _stop_review(reason: str, open_issues: List[str], signature: Dict[str, List[int]]) -> Dict[str, Any]:
+    """Leave the revision loop for human review, keeping unresolved issues visible to the reviewer."""
+    return {
+        "critique": "APPROVE",
+        "review_notes": "；".join(open_issues),
+        "review_signature": signature,
+        "stop_reason": reason,
+    }
 
 
 def human_review_node(state: AgentState) -> Dict[str, Any]:
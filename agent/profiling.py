@@ -0,0 +1,110 @@
+import cProfile
+import contextvars
+import io
+import os
+import pstats
+import threading
+from typing import AsyncIterator, List, Optional
+
+# Profiler of the run executing in this context; None (the default) means profiling is off.
+current_profiler = contextvars.ContextVar("run_profiler", default=None)
+
+
+class RunProfiler:
+    """cProfile for one run only: graph nodes in executor threads and the run's own asyncio steps.
+
+    Other requests sharing the event loop are not captured, because the profiler is enabled
+    only while this run's coroutines execute and disabled whenever they yield to the loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+
+    def _new(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def call(self, fn, *args, **kwargs):
+        profile = self._new()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active (process-wide on Python 3.12+); run unprofiled.
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    async def iterate(self, events: AsyncIterator) -> AsyncIterator:
+        """Re-yield events, profiling each synchronous stretch of the underlying generator."""
+        profile = self._new()
+        while True:
+            try:
+                item = await _ProfiledSteps(events.__anext__(), profile)
+            except StopAsyncIteration:
+                return
+            yield item
+
+    def stats(self) -> Optional[pstats.Stats]:
+        with self._lock:
+            profiles = [p for p in self._profiles if p.getstats()]
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def dump(self, path: str):
+        """Write the merged profile to path, accumulating into any earlier segment of the same run."""
+        stats = self.stats()
+        if stats is None:
+            return
+        if os.path.exists(path):
+            stats.add(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        stats.dump_stats(path)
+
+
+class _ProfiledSteps:
+    """Awaitable that drives a coroutine with the profile enabled only inside each send()."""
+
+    def __init__(self, coro, profile: cProfile.Profile):
+        self.coro = coro
+        self.profile = profile
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            try:
+                self.profile.enable()
+            except ValueError:
+                pass
+            try:
+                future = self.coro.throw(error) if error is not None else self.coro.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profile.disable()
+            try:
+                value, error = (yield future), None
+            except BaseException as e:  # cancellation and errors go back into the coroutine
+                value, error = None, e
+
+
+def node_call(fn, state):
+    """Run a graph node, under the current run's profiler if one is active."""
+    profiler = current_profiler.get()
+    if profiler is None:
+        return fn(state)
+    return profiler.call(fn, state)
+
+
+def render_text(path: str, sort: str = "cumulative", limit: int = 40) -> str:
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -73,6 +73,52 @@ SECTION_WRITER_PROMPT_TEMPLATE = """你是专业行业分析师。
 {critique}
 """
 
+INTRO_PROMPT_TEMPLATE = """你是专业行业分析师。
+请为下面的研报撰写简短“引言”，100-200 字，交代研究背景、范围与报告结构。
+只输出引言正文，不要输出标题，不要输出“参考来源”列表。
+
+研究主题：
+{task}
+
+报告章节：
+{plan}
+
+研究资料（节选）：
+{content}
+
+人工反馈（如有）：
+{human_feedback}
+
+历史上下文（如有）：
+{history_context}
+
+上一轮评审意见（如有）：
+{critique}
+"""
+
+CONCLUSION_PROMPT_TEMPLATE = """你是专业行业分析师。
+请为下面的研报撰写简短“结论”，150-250 字，概括核心判断并给出可执行建议。
+只输出结论正文，不要输出标题，不要输出“参考来源”列表。
+
+研究主题：
+{task}
+
+报告章节：
+{plan}
+
+研究资料（节选）：
+{content}
+
+人工反馈（如有）：
+{human_feedback}
+
+历史上下文（如有）：
+{history_context}
+
+上一轮评审意见（如有）：
+{critique}
+"""
+
 FINAL_WRITER_PROMPT_TEMPLATE = """你是资深总编辑。
 下面给出各章节草稿，请将其整合为一篇完整研报，要求简体中文、自然流畅、专业客观。
 需要补充必要的过渡、引言、结论，使整体叙述连贯。
@@ -101,6 +147,29 @@ FINAL_WRITER_PROMPT_TEMPLATE = """你是资深总编辑。
 {critique}
 """
 
+# Research digest: condenses the merged search results once per research round
+DIGEST_PROMPT_TEMPLATE = """你是资深研究助理。
+请将下面的检索资料整理为一份去重后的“事实清单”，供后续撰写研报使用。
+要求：
+1. 每条事实单独一行，以“- ”开头，一句话写清，保留具体数字、时间与主体。
+2. 合并重复或相近的内容，删除与研究主题无关的信息。
+3. 每条事实末尾用 [S编号] 标注出处，编号见“资料来源”；多个出处写作 [S1][S3]。
+4. 按计划中的主题分组，组名用“### ”开头；总条目不超过 {max_facts} 条。
+5. 只输出事实清单，不要输出其他说明。
+
+研究主题：
+{task}
+
+计划：
+{plan}
+
+资料来源：
+{sources}
+
+检索资料：
+{content}
+"""
+
 # Reviewer Prompt
 REVIEWER_PROMPT_TEMPLATE = """你是资深编辑。
 请审阅以下研报草稿。
@@ -113,3 +182,23 @@ REVIEWER_PROMPT_TEMPLATE = """你是资深编辑。
 2. 需要补充资料：输出 `RESEARCH: <需要检索的具体信息>`
 3. 需要改写：输出 `REVISE: <需要改写的具体要点>`
 """
+
+# Reviewer Prompt for later rounds: only the sections changed since the last review
+REVIEWER_DIFF_PROMPT_TEMPLATE = """你是资深编辑。
+你已审阅过这份研报的上一版，并给出了评审意见。作者据此修改后，下面只列出有改动的章节。
+请判断这些改动是否解决了上一轮意见，未列出的章节视为已通过。
+
+上一轮评审意见：
+{critique}
+
+全文章节目录：
+{outline}
+
+有改动的章节：
+{changes}
+
+规则（必须严格遵守输出格式，仅输出一行）：
+1. 通过：仅输出 `APPROVE`
+2. 需要补充资料：输出 `RESEARCH: <需要检索的具体信息>`
+3. 需要改写：输出 `REVISE: <需要改写的具体要点>`
+"""
@@ -0,0 +1,238 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, messages_from_dict, message_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from agent import metrics
+
+# Set RECORD_DIR to capture every thread's LLM and search I/O as <thread_id>.jsonl.gz.
+RECORD_DIR = os.getenv("RECORD_DIR", "")
+
+
+def _jsonable(value):
+    if isinstance(value, BaseMessage):
+        return {"__message__": message_to_dict(value)}
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def _restore(value):
+    if isinstance(value, dict):
+        if "__message__" in value:
+            return messages_from_dict([value["__message__"]])[0]
+        return {k: _restore(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_restore(v) for v in value]
+    return value
+
+
+def prompt_key(messages) -> str:
+    text = json.dumps([[getattr(m, "type", ""), str(getattr(m, "content", m))] for m in messages], ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class Recorder:
+    """Appends one gzip member per entry to <directory>/<thread_id>.jsonl.gz; a no-op without a directory."""
+
+    def __init__(self, directory: str = ""):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def path(self, thread_id: str) -> str:
+        return os.path.join(self.directory, f"{thread_id}.jsonl.gz")
+
+    def _write(self, thread_id: str, entry: Dict[str, Any]):
+        if not self.enabled or not thread_id:
+            return
+        line = json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path(thread_id), "ab") as f:
+                f.write(gzip.compress(line))
+
+    def record_event(self, thread_id: str, kind: str, values: Dict[str, Any]):
+        """Inputs that come from outside the graph: the initial state and human feedback updates."""
+        self._write(thread_id, {"kind": kind, "at": time.time(), "values": _jsonable(values)})
+
+    def _call_entry(self, kind: str, **fields) -> Dict[str, Any]:
+        return {
+            "kind": kind,
+            "at": time.time(),
+            "node": metrics.current_node.get(),
+            "section": metrics.current_section.get(),
+            **fields,
+        }
+
+    @contextmanager
+    def llm_call(self, model, messages):
+        """Record one chat call; assign the response to the yielded dict's "response"
+        (and "model" when another model than `model` ended up answering)."""
+        call = {"response": None, "model": None}
+        if not self.enabled:
+            yield call
+            return
+        thread_id = metrics.current_thread.get()
+        start = time.perf_counter()
+        try:
+            yield call
+        except Exception as e:
+            self._write(thread_id, self._call_entry(
+                "llm", model=metrics.model_name(model), key=prompt_key(messages),
+                messages=_jsonable(list(messages)), seconds=time.perf_counter() - start, error=repr(e),
+            ))
+            raise
+        response = call["response"]
+        self._write(thread_id, self._call_entry(
+            "llm", model=metrics.model_name(call["model"] or model), key=prompt_key(messages),
+            messages=_jsonable(list(messages)), seconds=time.perf_counter() - start,
+            content=getattr(response, "content", ""),
+            usage=getattr(response, "usage_metadata", None),
+        ))
+
+    @contextmanager
+    def search_call(self, kind: str, query: str):
+        """Record one search ("search" for result lists, "search_text" for the text fallback)."""
+        call = {"result": None}
+        if not self.enabled:
+            yield call
+            return
+        thread_id = metrics.current_thread.get()
+        start = time.perf_counter()
+        try:
+            yield call
+        except Exception as e:
+            self._write(thread_id, self._call_entry(
+                kind, query=query, seconds=time.perf_counter() - start, error=repr(e),
+            ))
+            raise
+        self._write(thread_id, self._call_entry(
+            kind, query=query, seconds=time.perf_counter() - start, result=call["result"],
+        ))
+
+
+recorder = Recorder(RECORD_DIR)
+
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+class Recording:
+    """Serves recorded LLM and search results back in per-node order.
+
+    A call is matched to the next unused entry of the same kind from the same node,
+    preferring one with an identical prompt/query; when node code changes what it sends,
+    the call still gets that node's next answer and counts as a mismatch. Each answer is
+    delayed by the recorded latency times `speed` (0 replays as fast as possible).
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]], speed: float = 1.0, strict: bool = False):
+        self.entries = entries
+        self.speed = speed
+        self.strict = strict
+        self.mismatches = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, List[Dict[str, Any]]] = defaultdict(list)
+        self._last: Dict[tuple, Dict[str, Any]] = {}
+        for entry in entries:
+            if entry["kind"] in ("llm", "search", "search_text"):
+                self._pending[(entry["kind"], entry["node"])].append(entry)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "Recording":
+        return cls(load_recording(path), **kwargs)
+
+    @property
+    def initial_state(self) -> Dict[str, Any]:
+        for entry in self.entries:
+            if entry["kind"] == "input":
+                return _restore(entry["values"])
+        raise ReplayMiss("recording has no initial state")
+
+    @property
+    def feedback(self) -> List[Dict[str, Any]]:
+        return [_restore(e["values"]) for e in self.entries if e["kind"] == "feedback"]
+
+    def take(self, kind: str, match_field: str, match_value: str) -> Dict[str, Any]:
+        node = metrics.current_node.get()
+        with self._lock:
+            pending = self._pending.get((kind, node), [])
+            for i, entry in enumerate(pending):
+                if entry.get(match_field) == match_value:
+                    entry = pending.pop(i)
+                    break
+            else:
+                if pending:
+                    entry = pending.pop(0)
+                    self.mismatches += 1
+                elif not self.strict and (kind, node) in self._last:
+                    entry = self._last[(kind, node)]
+                    self.misses += 1
+                else:
+                    raise ReplayMiss(f"no recorded {kind} call left for node {node!r}")
+            self._last[(kind, node)] = entry
+        if self.speed > 0:
+            time.sleep(entry.get("seconds", 0.0) * self.speed)
+        if entry.get("error"):
+            raise RuntimeError(f"recorded failure: {entry['error']}")
+        return entry
+
+    def chat_model(self) -> "ReplayChatModel":
+        # Keep the recorded model name so token costs are priced as in the original run.
+        names = [e["model"] for e in self.entries if e["kind"] == "llm" and e.get("model")]
+        model = ReplayChatModel(model_name=names[0] if names else "replay")
+        model._recording = self
+        return model
+
+    def search(self) -> "ReplaySearch":
+        return ReplaySearch(self)
+
+
+class ReplayChatModel(BaseChatModel):
+    model_name: str = "replay"
+    _recording: Optional[Recording] = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        entry = self._recording.take("llm", "key", prompt_key(messages))
+        message = AIMessage(content=entry.get("content", ""), usage_metadata=entry.get("usage") or None)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class ReplaySearch:
+    provider = "replay"
+
+    def __init__(self, recording: Recording):
+        self.recording = recording
+
+    def __call__(self, query: str):
+        return self.recording.take("search", "query", query).get("result") or []
+
+    def run(self, query: str) -> str:
+        return self.recording.take("search_text", "query", query).get("result") or ""
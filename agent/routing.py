@@ -0,0 +1,170 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agent import metrics
+
+
+class ModelTimeout(TimeoutError):
+    pass
+
+
+def parse_routes(spec: str, default: List[str]) -> Dict[str, List[str]]:
+    """'planner=qwen-turbo,deepseek-v3.1;default=deepseek-v3.1' -> {node: [model, fallback, ...]}.
+
+    Nodes without an entry use the "default" chain, which falls back to `default`.
+    """
+    routes: Dict[str, List[str]] = {}
+    for entry in (spec or "").split(";"):
+        node, _, chain = entry.partition("=")
+        models = [m.strip() for m in chain.split(",") if m.strip()]
+        if node.strip() and models:
+            routes[node.strip()] = models
+    routes.setdefault("default", list(default))
+    return routes
+
+
+class Attempt:
+    """One model's try at a call. A streaming caller must pass every delta through emit(),
+    so nothing leaks out of an attempt the router has already given up on."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.emitted = False
+        self.abandoned = False
+        self._lock = threading.Lock()
+
+    def emit(self, on_text, text: str):
+        with self._lock:
+            if self.abandoned:
+                return
+            self.emitted = True
+        on_text(text)
+
+    def abandon(self) -> bool:
+        """Give up on this attempt unless it has already sent output; True if abandoned."""
+        with self._lock:
+            if not self.emitted:
+                self.abandoned = True
+            return self.abandoned
+
+
+class ModelRouter:
+    """Per-node ordered fallback chains over named chat models.
+
+    A call goes to the first model of the node's chain and moves down the chain when a
+    model raises or exceeds `timeout` seconds. The last model left to try is never timed
+    out: with nothing to fall back to, a slow answer beats none. A model that raised is skipped (tried last)
+    for `cooldown` seconds. Latency is tracked per (node, model) as an EWMA, so comparisons
+    are made on the same kind of prompt; a later model in the chain is preferred while its
+    EWMA is `prefer_ratio` times lower than the first choice's. EWMAs older than
+    `latency_ttl` are ignored, which sends traffic back to the configured order so that a
+    recovered primary is tried again.
+    """
+
+    def __init__(
+        self,
+        models: Dict[str, Any],
+        routes: Dict[str, List[str]],
+        timeout: Optional[float] = None,
+        alpha: float = 0.3,
+        prefer_ratio: float = 1.5,
+        cooldown: float = 30.0,
+        latency_ttl: float = 300.0,
+        workers: int = 32,
+    ):
+        missing = {m for chain in routes.values() for m in chain} - set(models)
+        if missing:
+            raise ValueError(f"routes name unknown models: {sorted(missing)}")
+        self.models = dict(models)
+        self.routes = {node: list(chain) for node, chain in routes.items()}
+        self.routes.setdefault("default", [next(iter(self.models))])
+        self.timeout = timeout or None
+        self.alpha = alpha
+        self.prefer_ratio = prefer_ratio
+        self.cooldown = cooldown
+        self.latency_ttl = latency_ttl
+        self._lock = threading.Lock()
+        self._latency: Dict[Tuple[str, str], Tuple[float, float]] = {}  # (node, model) -> (ewma, observed at)
+        self._cooling: Dict[str, float] = {}  # model -> monotonic time it may be preferred again
+        fallbacks = any(len(chain) > 1 for chain in self.routes.values())
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm") if self.timeout and fallbacks else None
+
+    def route(self, node: str) -> List[str]:
+        return self.routes.get(node) or self.routes["default"]
+
+    def order(self, node: str) -> List[str]:
+        """The node's chain in the order it will be tried right now."""
+        chain = self.route(node)
+        now = time.monotonic()
+        with self._lock:
+            cooling = [m for m in chain if self._cooling.get(m, 0.0) > now]
+            ready = [m for m in chain if m not in cooling]
+            latency = {
+                m: ewma for m in ready
+                for ewma, seen in [self._latency.get((node, m), (None, 0.0))]
+                if ewma is not None and now - seen <= self.latency_ttl
+            }
+        if len(ready) > 1 and ready[0] in latency:
+            faster = [m for m in ready[1:] if m in latency and latency[m] * self.prefer_ratio < latency[ready[0]]]
+            if faster:
+                best = min(faster, key=latency.get)
+                ready = [best] + [m for m in ready if m != best]
+        return ready + cooling
+
+    def observe(self, node: str, model: str, seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            ewma, seen = self._latency.get((node, model), (None, 0.0))
+            if ewma is None or now - seen > self.latency_ttl:
+                ewma = seconds
+            else:
+                ewma = self.alpha * seconds + (1 - self.alpha) * ewma
+            self._latency[(node, model)] = (ewma, now)
+
+    def _fail(self, node: str, model: str, reason: str):
+        if reason == "error":
+            with self._lock:
+                self._cooling[model] = time.monotonic() + self.cooldown
+        metrics.registry.record_fallback(node, model, reason)
+
+    def call(self, node: str, fn: Callable[[Any, Attempt], Any]) -> Tuple[str, Any]:
+        """Run fn(model, attempt) down the node's chain; (model name, result) of the first success."""
+        order = self.order(node)
+        error: Optional[BaseException] = None
+        for position, name in enumerate(order, start=1):
+            attempt = Attempt(name)
+            started = time.monotonic()
+            try:
+                result = self._run(fn, self.models[name], attempt, last=position == len(order))
+            except ModelTimeout as e:
+                self.observe(node, name, self.timeout)
+                self._fail(node, name, "timeout")
+                error = e
+                continue
+            except Exception as e:
+                if attempt.emitted:
+                    raise  # output already went to the caller; another model cannot take over
+                self._fail(node, name, "error")
+                error = e
+                continue
+            self.observe(node, name, time.monotonic() - started)
+            return name, result
+        raise error if error is not None else RuntimeError(f"no model configured for node {node!r}")
+
+    def _run(self, fn, model, attempt: Attempt, last: bool = False):
+        if self._pool is None or last:
+            return fn(model, attempt)
+        future = self._pool.submit(contextvars.copy_context().run, fn, model, attempt)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            if not attempt.abandon():
+                return future.result()  # already streaming to the caller: let it finish
+            raise ModelTimeout(f"{attempt.model} gave no answer within {self.timeout:g}s") from None
+
+    def latency_snapshot(self) -> Dict[Tuple[str, str], float]:
+        with self._lock:
+            return {key: ewma for key, (ewma, _) in self._latency.items()}
@@ -0,0 +1,184 @@
+import random
+import re
+import zlib
+from typing import Any, Dict, List, Set, Tuple
+
+_STEP_PREFIX = re.compile(r"^\s*(步骤\s*\d+|step\s*\d+|\d+[.、])\s*[:：]?\s*", re.IGNORECASE)
+_NOISE = re.compile(r"[\s#*`>\-|：:，,。.、；;！!？?（）()【】\[\]\"'“”]+")
+
+
+def normalize(text: str) -> str:
+    return _NOISE.sub("", _STEP_PREFIX.sub("", text or "")).lower()
+
+
+def char_ngrams(text: str, n: int = 2) -> Set[str]:
+    # Character n-grams work for Chinese and mixed-language text without a tokenizer.
+    norm = normalize(text)
+    if len(norm) < n:
+        return {norm} if norm else set()
+    return {norm[i:i + n] for i in range(len(norm) - n + 1)}
+
+
+def overlap_score(query: str, text: str) -> float:
+    """Fraction of the query's n-grams that also appear in text."""
+    q = char_ngrams(query)
+    if not q:
+        return 0.0
+    return len(q & char_ngrams(text)) / len(q)
+
+
+def select_relevant(query: str, texts: List[str], k: int = 4, min_score: float = 0.2) -> List[str]:
+    """Top-k texts by overlap with query, kept in their original order."""
+    scored = [(overlap_score(query, t), i) for i, t in enumerate(texts) if isinstance(t, str) and t.strip()]
+    top = sorted([x for x in scored if x[0] >= min_score], reverse=True)[:k]
+    return [texts[i] for _, i in sorted(top, key=lambda x: x[1])]
+
+
+def split_sections(report: str) -> List[str]:
+    """Split a Markdown report on `#`/`##` headings; each part keeps its heading."""
+    parts = re.split(r"(?m)^(?=#{1,3}\s)", report or "")
+    return [p.strip() for p in parts if p.strip()]
+
+
+_SECTION_REF = re.compile(r"第\s*(\d+)\s*[节章部]|(?:步骤|section|part)\s*(\d+)", re.IGNORECASE)
+
+
+def targeted_sections(note: str, titles: List[str], min_shared: int = 4) -> Set[str]:
+    """Titles a critique/feedback note refers to, by number ("第2节") or by wording.
+
+    A title matches when it shares at least min_shared character bigrams with the note,
+    or half of its own. A note that names no section targets all of them.
+    """
+    hits = set()
+    for match in _SECTION_REF.finditer(note or ""):
+        index = int(match.group(1) or match.group(2)) - 1
+        if 0 <= index < len(titles):
+            hits.add(titles[index])
+    note_grams = char_ngrams(note)
+    for title in titles:
+        title_grams = char_ngrams(title)
+        shared = len(title_grams & note_grams)
+        if title_grams and (shared >= min_shared or shared / len(title_grams) >= 0.5):
+            hits.add(title)
+    return hits or set(titles)
+
+
+_MERSENNE = (1 << 61) - 1
+
+
+class MinHashIndex:
+    """In-memory MinHash + LSH index over short texts (e.g. report topics)."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, ngram: int = 2):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        rng = random.Random(1147)
+        self._perms = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+        self._signatures: Dict[Any, Tuple[int, ...]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[Any]] = {}
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(g.encode("utf-8")) for g in char_ngrams(text, self.ngram)]
+        if not hashes:
+            return tuple([_MERSENNE] * self.num_perm)
+        return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._perms)
+
+    def _bands(self, sig: Tuple[int, ...]):
+        for i in range(self.bands):
+            yield i, sig[i * self.rows:(i + 1) * self.rows]
+
+    def add(self, key, text: str) -> None:
+        self.remove(key)
+        sig = self.signature(text)
+        self._signatures[key] = sig
+        for band in self._bands(sig):
+            self._buckets.setdefault(band, set()).add(key)
+
+    def remove(self, key) -> None:
+        sig = self._signatures.pop(key, None)
+        if sig is None:
+            return
+        for band in self._bands(sig):
+            bucket = self._buckets.get(band)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def clear(self) -> None:
+        self._signatures.clear()
+        self._buckets.clear()
+
+    def query(self, text: str, threshold: float = 0.8) -> List[Tuple[Any, float]]:
+        """Keys whose estimated Jaccard similarity to text is >= threshold, best first."""
+        sig = self.signature(text)
+        candidates = set()
+        for band in self._bands(sig):
+            candidates |= self._buckets.get(band, set())
+        matches = []
+        for key in candidates:
+            other = self._signatures[key]
+            score = sum(1 for x, y in zip(sig, other) if x == y) / self.num_perm
+            if score >= threshold:
+                matches.append((key, score))
+        return sorted(matches, key=lambda m: m[1], reverse=True)
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+
+# 5-character shingles: long enough that two drafts on the same topic only look alike
+# when they share wording, not just vocabulary.
+_draft_hasher = MinHashIndex(num_perm=64, ngram=5)
+
+
+def draft_signature(text: str) -> List[int]:
+    """Compact MinHash signature of a draft; small enough to keep in graph state."""
+    return list(_draft_hasher.signature(text))
+
+
+def signature_similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of two draft_signature() values (0.0 if either is missing)."""
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def text_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of two short texts' character bigrams, e.g. two critiques."""
+    grams_a, grams_b = char_ngrams(a), char_ngrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def near_duplicate_groups(texts: List[str], threshold: float = 0.8, ngram: int = 5) -> List[List[int]]:
+    """Group texts whose character-shingle sets have Jaccard similarity >= threshold.
+
+    Each group lists indices in input order, starting with its first occurrence, which is
+    the one later texts are compared against. Exact set Jaccard rather than MinHash: for
+    the tens of snippets in one run's corpus, C-level set intersections are much cheaper
+    than computing signatures. Texts with nothing to compare always stand alone.
+    """
+    reps: List[Tuple[int, Set[str]]] = []
+    groups: Dict[int, List[int]] = {}
+    for i, text in enumerate(texts):
+        grams = char_ngrams(text, ngram) if normalize(text) else set()
+        match = None
+        for rep, rep_grams in reps if grams else ():
+            small, large = sorted((len(grams), len(rep_grams)))
+            if small < threshold * large:
+                continue  # sizes alone rule out reaching the threshold
+            shared = len(grams & rep_grams)
+            if shared / (len(grams) + len(rep_grams) - shared) >= threshold:
+                match = rep
+                break
+        if match is None:
+            groups[i] = [i]
+            if grams:
+                reps.append((i, grams))
+        else:
+            groups[match].append(i)
+    return list(groups.values())
@@ -0,0 +1,73 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from agent import metrics
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Process-wide coalescing of identical in-flight calls.
+
+    The first caller for a key (the leader) runs the call; callers arriving with the same
+    key while it is in flight wait and receive the same result, or the same exception.
+    Completed calls are forgotten immediately: this deduplicates concurrent work, it is
+    not a cache.
+
+    A leader that is interrupted rather than failing (cancellation, KeyboardInterrupt and
+    other BaseExceptions that are not Exceptions) hands nothing to its followers; they
+    retry instead, and one of them becomes the new leader.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    call.followers += 1
+            if leader:
+                return self._lead(key, call, fn)
+            call.done.wait()
+            if call.error is None:
+                metrics.registry.record_shared_call(self.kind)
+                return call.result
+            if isinstance(call.error, Exception):
+                metrics.registry.record_shared_call(self.kind)
+                raise call.error
+            # The leader was interrupted, not failed: run the call again.
+
+    def _lead(self, key: Hashable, call: _Call, fn: Callable[[], Any]) -> Any:
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+llm_calls = SingleFlight("llm")
+search_calls = SingleFlight("search")
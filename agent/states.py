@@ -2,6 +2,11 @@ from typing import TypedDict, List, Annotated, Dict
 import operator
 from langchain_core.messages import BaseMessage
 
+
+def merge_drafts(left: Dict[str, str], right: Dict[str, str]) -> Dict[str, str]:
+    """Dict merge where later writes replace earlier keys (parallel section branches each add theirs)."""
+    return {**(left or {}), **(right or {})}
+
 class AgentState(TypedDict):
     task: str
     plan: List[str]
@@ -17,3 +22,28 @@ class AgentState(TypedDict):
     revision_number: int
     messages: Annotated[List[BaseMessage], operator.add]
     sources: Annotated[List[Dict[str, str]], operator.add]
+    # section title -> draft_cache key of its current draft
+    section_drafts: Annotated[Dict[str, str], merge_drafts]
+    # section_key(inputs) -> "## title\nbody"
+    draft_cache: Annotated[Dict[str, str], merge_drafts]
+    # len(research_chunks) the current section drafts were written from
+    draft_corpus: int
+    # section heading -> fingerprint of the draft the LLM reviewer last saw
+    reviewed_sections: Dict[str, str]
+    # pre-screen issues still open when revisions ran out, for the human reviewer
+    review_notes: str
+    # draft_signature() per section heading of the draft the reviewer last saw ("" for the
+    # whole draft), for convergence checks
+    review_signature: Dict[str, List[int]]
+    # parts (plan sections, 引言/结论) the writer rewrote for the current draft; empty when
+    # the whole draft was written afresh
+    revised_parts: List[str]
+    # why the revision loop handed over to human review: approved, max_revisions,
+    # draft_converged or critique_repeated
+    stop_reason: str
+    # fact sheet condensed from research_chunks, and the corpus_key() it was built from
+    research_digest: str
+    digest_corpus: str
+    # research_chunks without near-duplicate snippets, and len(research_chunks) it covers
+    merged_chunks: List[str]
+    merged_from: int
@@ -1,24 +1,57 @@
+import os
 import uuid
 import json
 import asyncio
+import gzip
+import hashlib
+import re
+import time
+import zlib
 from datetime import datetime, timedelta, timezone
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from langchain_core.messages import HumanMessage
 
-from backend.models import ResearchRequest, FeedbackRequest, HistorySaveRequest, HistoryFollowupRequest
+from backend.models import ResearchRequest, FeedbackRequest, HistorySaveRequest, HistoryFollowupRequest, BatchRequest
+from agent import metrics, nodes
+from agent.callcache import CallCache, current_cache
 from agent.graph import build_graph
+from agent.profiling import RunProfiler, current_profiler, render_text
+from agent.recording import recorder
+from agent.similarity import MinHashIndex, select_relevant, split_sections
 from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 import aiosqlite
 
+try:
+    import brotli
+except ImportError:  # optional: responses fall back to gzip
+    brotli = None
+
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+HISTORY_DB = os.getenv("HISTORY_DB", "history.sqlite")
+TOPIC_MATCH_THRESHOLD = float(os.getenv("TOPIC_MATCH_THRESHOLD", "0.7"))
+EXPORT_BATCH_SIZE = 200
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+HISTORY_COLUMNS = (
+    "id", "thread_id", "topic", "report", "summary", "sources", "created_at", "plan", "research_chunks", "updated_at"
+)
+COMPRESS_MIN_BYTES = 1024
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+MAX_BATCH_TOPICS = 100
+MAX_TRACKED_BATCHES = 20
+JSON_COLUMNS = ("sources", "plan", "research_chunks")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    conn = await aiosqlite.connect("checkpoints.sqlite")
+    conn = await aiosqlite.connect(CHECKPOINT_DB)
     checkpointer = AsyncSqliteSaver(conn)
+    # Every checkpoint read and write (one write per node step) serializes on this lock.
+    checkpointer.lock = _TimedLock("checkpoint")
     app.state.graph = build_graph(checkpointer)
-    history_conn = await aiosqlite.connect("history.sqlite")
+    history_conn = await aiosqlite.connect(HISTORY_DB)
     await history_conn.execute("PRAGMA journal_mode=WAL;")
     await history_conn.execute(
         """
@@ -29,35 +62,100 @@ async def lifespan(app: FastAPI):
             report TEXT,
             summary TEXT,
             sources TEXT,
-            created_at TEXT
+            created_at TEXT,
+            plan TEXT,
+            research_chunks TEXT,
+            updated_at TEXT
         )
         """
     )
-    # Backfill/ensure summary column exists if table was created earlier.
+    # Backfill/ensure newer columns exist if table was created earlier.
     async with history_conn.execute("PRAGMA table_info(history)") as cursor:
         cols = [row[1] for row in await cursor.fetchall()]
-    if "summary" not in cols:
-        await history_conn.execute("ALTER TABLE history ADD COLUMN summary TEXT")
+    for col in ("summary", "plan", "research_chunks", "updated_at"):
+        if col not in cols:
+            await history_conn.execute(f"ALTER TABLE history ADD COLUMN {col} TEXT")
     await history_conn.commit()
     app.state.history_conn = history_conn
     app.state.history_lock = asyncio.Lock()
+    app.state.topic_index = MinHashIndex()
+    await _rebuild_topic_index()
+    app.state.topic_match_stats = {"lookups": 0, "hits": 0, "served": 0, "refreshed": 0}
+    app.state.active_streams = set()
+    app.state.batches = {}
     try:
         yield
     finally:
+        running = [b["task"] for b in app.state.batches.values() if not b["task"].done()]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
         await history_conn.close()
         await conn.close()
 
 app = FastAPI(title="Research Agent API", lifespan=lifespan)
 
-@app.post("/start")
-async def start_research(request: ResearchRequest):
-    """Start a new research task."""
-    graph = app.state.graph
-    thread_id = str(uuid.uuid4())
-    config = {"configurable": {"thread_id": thread_id}}
-    
-    initial_state = {
-        "task": request.topic,
+class _TimedLock:
+    """asyncio.Lock that records how long each acquirer queued, under metrics lock `name`."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = asyncio.Lock()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        await self._lock.acquire()
+        metrics.registry.record_lock_wait(self.name, time.perf_counter() - start)
+
+    async def __aexit__(self, *exc):
+        self._lock.release()
+
+@asynccontextmanager
+async def _history_lock():
+    """Serialize writes on the shared history connection, recording how long each writer queued."""
+    start = time.perf_counter()
+    async with app.state.history_lock:
+        metrics.registry.record_lock_wait("history", time.perf_counter() - start)
+        yield
+
+async def _rebuild_topic_index():
+    app.state.topic_index.clear()
+    async with app.state.history_conn.execute("SELECT id, topic FROM history") as cursor:
+        async for history_id, past_topic in cursor:
+            app.state.topic_index.add(history_id, past_topic or "")
+
+async def _match_topic(topic: str, threshold: Optional[float] = None) -> Optional[dict]:
+    """Best stored report whose topic is a near-duplicate of topic, if any."""
+    stats = app.state.topic_match_stats
+    stats["lookups"] += 1
+    matches = app.state.topic_index.query(topic, threshold if threshold is not None else TOPIC_MATCH_THRESHOLD)
+    if not matches:
+        return None
+    history_id, similarity = matches[0]
+    async with app.state.history_conn.execute(
+        "SELECT id, thread_id, topic, summary, created_at FROM history WHERE id = ?",
+        (history_id,)
+    ) as cursor:
+        row = await cursor.fetchone()
+    if not row:
+        return None
+    stats["hits"] += 1
+    return {
+        "id": row[0],
+        "thread_id": row[1],
+        "topic": row[2],
+        "summary": row[3],
+        "created_at": row[4],
+        "similarity": round(similarity, 3),
+    }
+
+def _initial_state(topic: str, max_revisions: int = 2, **seed) -> dict:
+    """Input for a new thread; seed overrides fields such as research_chunks or history_context."""
+    state = {
+        "task": topic,
         "plan": [],
         "research_tasks": [],
         "research_task": "",
@@ -67,11 +165,52 @@ async def start_research(request: ResearchRequest):
         "human_action": "",
         "human_feedback": "",
         "history_context": "",
-        "max_revisions": 2,
+        "max_revisions": max_revisions,
         "revision_number": 0,
         "messages": [],
-        "sources": []
+        "sources": [],
     }
+    state.update(seed)
+    return state
+
+@app.post("/start")
+async def start_research(request: ResearchRequest):
+    """Start a new research task.
+
+    When a stored report has a near-duplicate topic, `reuse` decides what happens:
+    "ask" returns the match without starting, "serve" returns the stored report and its
+    sources, "refresh" starts an incremental run seeded with its research, and "new" (the
+    default) ignores it.
+    """
+    if request.reuse != "new":
+        match = await _match_topic(request.topic, request.match_threshold)
+        if match and request.reuse == "serve":
+            async with app.state.history_conn.execute(
+                "SELECT report, sources FROM history WHERE id = ?", (match["id"],)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row:
+                app.state.topic_match_stats["served"] += 1
+                return {
+                    "thread_id": None,
+                    "match": match,
+                    "served": True,
+                    "report": row[0] or "",
+                    "sources": json.loads(row[1]) if row[1] else [],
+                }
+            match = None  # deleted since the index lookup: start a new run
+        if match and request.reuse == "refresh":
+            app.state.topic_match_stats["refreshed"] += 1
+            thread_id = await _start_from_history(match["id"], request.topic)
+            return {"thread_id": thread_id, "match": match}
+        if match:
+            return {"thread_id": None, "match": match}
+
+    graph = app.state.graph
+    thread_id = str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    
+    initial_state = _initial_state(request.topic)
     
     # Start the graph in background (conceptually)
     # Since LangGraph is stateful and checkpointed, we just need to init it.
@@ -108,6 +247,7 @@ async def start_research(request: ResearchRequest):
     # Let's just save the initial state to the checkpointer using update_state
     # This effectively "queues" the task.
     await graph.aupdate_state(config, initial_state)
+    recorder.record_event(thread_id, "input", initial_state)
     
     return {"thread_id": thread_id}
 
@@ -128,7 +268,16 @@ async def submit_feedback(request: FeedbackRequest):
             "messages": [HumanMessage(content="Human Feedback: approve")]
         }
         await graph.aupdate_state(config, update, as_node="human_review_node")
-        return {"status": "approved", "message": "Feedback received. Connect to /stream to resume."}
+        recorder.record_event(request.thread_id, "feedback", update)
+        # Finish the run and save it here rather than on the client's next /stream, so an
+        # approved report is kept even if the browser closes now. Shielded: a client
+        # disconnect must not cancel the save halfway.
+        history_id = await asyncio.shield(_finish_approved(graph, config))
+        return {
+            "status": "approved",
+            "history_id": history_id,
+            "message": "Report approved and saved." if history_id is not None else "Feedback received. Connect to /stream to resume.",
+        }
         
     elif request.action == "reject":
         # Update state with feedback and pretend it came from reviewer to trigger rollback
@@ -140,59 +289,285 @@ async def submit_feedback(request: FeedbackRequest):
         }
         
         await graph.aupdate_state(config, update, as_node="human_review_node")
+        recorder.record_event(request.thread_id, "feedback", update)
         
         return {"status": "rejected", "message": "Feedback recorded. Connect to /stream to resume (rolling back to Writer)."}
 
-@app.post("/history/save")
-async def save_history(request: HistorySaveRequest):
+async def save_history(thread_id: str, topic: str, report: str, sources, plan=None, research_chunks=None) -> int:
+    """Idempotent upsert of a finished report and its research corpus, keyed by thread_id. Returns the row id."""
     conn = app.state.history_conn
-    sources_json = json.dumps(request.sources or [], ensure_ascii=False)
-    summary = _make_summary(request.report)
+    sources_json = json.dumps(sources or [], ensure_ascii=False)
+    plan_json = json.dumps(plan or [], ensure_ascii=False)
+    chunks_json = json.dumps(research_chunks or [], ensure_ascii=False)
+    summary = _make_summary(report)
     created_at = (datetime.now().astimezone() + timedelta(hours=8)).isoformat()
 
-    async with app.state.history_lock:
+    async with _history_lock():
         await conn.execute(
             """
-            INSERT INTO history (thread_id, topic, report, summary, sources, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO history (thread_id, topic, report, summary, sources, created_at, plan, research_chunks, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(thread_id) DO UPDATE SET
                 topic=excluded.topic,
                 report=excluded.report,
                 summary=excluded.summary,
-                sources=excluded.sources
+                sources=excluded.sources,
+                plan=excluded.plan,
+                research_chunks=excluded.research_chunks,
+                updated_at=excluded.updated_at
             """,
-            (request.thread_id, request.topic, request.report, summary, sources_json, created_at)
+            (thread_id, topic, report, summary, sources_json, created_at, plan_json, chunks_json, created_at)
         )
         await conn.commit()
+        async with conn.execute("SELECT id FROM history WHERE thread_id = ?", (thread_id,)) as cursor:
+            row = await cursor.fetchone()
+    app.state.topic_index.add(row[0], topic)
+    return row[0]
 
-    return {"status": "ok"}
+async def _autosave_finished_thread(graph, config) -> Optional[int]:
+    """Persist the final checkpoint state once the thread has reached END.
+
+    A finished thread's report no longer changes, so when its row exists (saved by /feedback
+    or an earlier /stream) the existing id is returned without rewriting it; that keeps
+    updated_at, and with it the /history ETags, stable across reconnects.
+    """
+    snapshot = await graph.aget_state(config)
+    if snapshot.next:
+        return None
+    async with app.state.history_conn.execute(
+        "SELECT id FROM history WHERE thread_id = ?", (config["configurable"]["thread_id"],)
+    ) as cursor:
+        row = await cursor.fetchone()
+    if row:
+        return row[0]
+    values = snapshot.values or {}
+    report = values.get("content", "")
+    if not report:
+        return None
+    return await save_history(
+        config["configurable"]["thread_id"],
+        values.get("task", ""),
+        report,
+        values.get("sources", []),
+        values.get("plan", []),
+        values.get("research_chunks", []),
+    )
+
+async def _finish_approved(graph, config) -> Optional[int]:
+    """Run an approved thread from human_review_node to END (no LLM work) and autosave it."""
+    thread_id = config["configurable"]["thread_id"]
+    if thread_id in app.state.active_streams:
+        return None  # a /stream connection is already driving it and will save it
+    app.state.active_streams.add(thread_id)
+    try:
+        async for _ in graph.astream(None, config=config):
+            pass
+        return await _autosave_finished_thread(graph, config)
+    finally:
+        app.state.active_streams.discard(thread_id)
+
+@app.post("/history/save")
+async def save_history_endpoint(request: HistorySaveRequest):
+    """Optional client upload; finished runs are already saved by /feedback and /stream."""
+    history_id = await save_history(
+        request.thread_id, request.topic, request.report, request.sources, request.plan, request.research_chunks
+    )
+    return {"status": "ok", "id": history_id}
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match", "")
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+def _cached_json(request: Request, payload, etag: Optional[str] = None, max_age: int = 0) -> Response:
+    """JSON response with a weak ETag, 304 on If-None-Match, and br/gzip for large bodies."""
+    body = None
+    if etag is None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={max_age}, must-revalidate",
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if body is None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accept = request.headers.get("accept-encoding", "")
+        if brotli is not None and "br" in accept:
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accept:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/history/list")
-async def list_history(limit: int = 20):
+async def list_history(request: Request, limit: int = Query(20, ge=1, le=100), before_id: Optional[int] = None):
+    """Newest-first page of history; pass next_before_id back as before_id for the next page."""
     conn = app.state.history_conn
     async with conn.execute(
-        "SELECT id, thread_id, topic, summary, created_at FROM history ORDER BY id DESC LIMIT ?",
-        (limit,)
+        "SELECT id, thread_id, topic, summary, created_at FROM history WHERE id < ? ORDER BY id DESC LIMIT ?",
+        (before_id if before_id is not None else 2 ** 63 - 1, limit)
     ) as cursor:
         rows = await cursor.fetchall()
     items = [
         {"id": r[0], "thread_id": r[1], "topic": r[2], "summary": r[3], "created_at": r[4]}
         for r in rows
     ]
-    return {"items": items}
+    next_before_id = items[-1]["id"] if items and len(items) == limit else None
+    return _cached_json(request, {"items": items, "next_before_id": next_before_id})
+
+@app.get("/history/match-stats")
+async def topic_match_stats():
+    stats = dict(app.state.topic_match_stats)
+    stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+    stats["indexed_topics"] = len(app.state.topic_index)
+    stats["threshold"] = TOPIC_MATCH_THRESHOLD
+    return stats
+
+@app.get("/history/export")
+async def export_history(since_id: int = 0, since: Optional[str] = None, compress: bool = Query(False, alias="gzip")):
+    """Stream history rows with id > since_id (and created_at >= since) as NDJSON.
+
+    Rows are read through a dedicated connection in batches, so memory stays flat
+    however large the table is. The last exported `id` is the cursor for the next call.
+    """
+    query = f"SELECT {', '.join(HISTORY_COLUMNS)} FROM history WHERE id > ?"
+    params = [since_id]
+    if since:
+        query += " AND created_at >= ?"
+        params.append(since)
+    query += " ORDER BY id"
+
+    async def row_lines():
+        async with aiosqlite.connect(HISTORY_DB) as export_conn:
+            async with export_conn.execute(query, params) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(EXPORT_BATCH_SIZE)
+                    if not rows:
+                        break
+                    for row in rows:
+                        item = dict(zip(HISTORY_COLUMNS, row))
+                        for col in JSON_COLUMNS:
+                            item[col] = json.loads(item[col]) if item[col] else []
+                        yield (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+
+    async def gzip_lines():
+        compressor = zlib.compressobj(wbits=31)
+        async for line in row_lines():
+            chunk = compressor.compress(line)
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    if compress:
+        return StreamingResponse(
+            gzip_lines(),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="history.ndjson.gz"'},
+        )
+    return StreamingResponse(row_lines(), media_type="application/x-ndjson")
+
+def _import_row(line: bytes) -> Optional[tuple]:
+    """Decode one exported NDJSON line into an insert tuple, or None if it is unusable."""
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(item, dict) or not item.get("thread_id"):
+        return None
+    report = item.get("report") or ""
+    now = (datetime.now().astimezone() + timedelta(hours=8)).isoformat()
+    return (
+        item["thread_id"],
+        item.get("topic") or "",
+        report,
+        item.get("summary") or _make_summary(report),
+        json.dumps(item.get("sources") or [], ensure_ascii=False),
+        item.get("created_at") or now,
+        json.dumps(item.get("plan") or [], ensure_ascii=False),
+        json.dumps(item.get("research_chunks") or [], ensure_ascii=False),
+        now,
+    )
+
+@app.post("/history/import")
+async def import_history(request: Request):
+    """Bulk upsert NDJSON rows produced by /history/export (plain or gzip), keyed by thread_id."""
+    conn = app.state.history_conn
+    decompressor = zlib.decompressobj(wbits=47)  # auto-detects gzip/zlib headers
+    gzipped = None
+    buffer = b""
+    batch = []
+    imported = 0
+    skipped = 0
+
+    async def flush():
+        async with _history_lock():
+            await conn.executemany(
+                """
+                INSERT INTO history (thread_id, topic, report, summary, sources, created_at, plan, research_chunks, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(thread_id) DO UPDATE SET
+                    topic=excluded.topic,
+                    report=excluded.report,
+                    summary=excluded.summary,
+                    sources=excluded.sources,
+                    plan=excluded.plan,
+                    research_chunks=excluded.research_chunks,
+                    updated_at=excluded.updated_at
+                """,
+                batch,
+            )
+            await conn.commit()
+        batch.clear()
+
+    async def body_lines():
+        nonlocal gzipped, buffer
+        async for chunk in request.stream():
+            if gzipped is None and chunk:
+                gzipped = chunk[:2] == b"\x1f\x8b"
+            buffer += decompressor.decompress(chunk) if gzipped else chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line
+        if gzipped:
+            buffer += decompressor.flush()
+        yield buffer
+
+    async for line in body_lines():
+        if not line.strip():
+            continue
+        row = _import_row(line)
+        if row is None:
+            skipped += 1
+            continue
+        batch.append(row)
+        imported += 1
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    await _rebuild_topic_index()
+    return {"status": "ok", "imported": imported, "skipped": skipped}
 
 @app.get("/history/{history_id}")
-async def get_history(history_id: int):
+async def get_history(history_id: int, request: Request):
     conn = app.state.history_conn
     async with conn.execute(
-        "SELECT id, thread_id, topic, report, summary, sources, created_at FROM history WHERE id = ?",
+        "SELECT id, thread_id, topic, report, summary, sources, created_at, updated_at FROM history WHERE id = ?",
         (history_id,)
     ) as cursor:
         row = await cursor.fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="History not found")
+    # Rows only change through save/import, which bump updated_at, so the ETag comes
+    # from it and a revalidation skips serializing and compressing the report.
+    etag = 'W/"%s"' % hashlib.sha1(f"{row[0]}:{row[7] or row[6]}".encode("utf-8")).hexdigest()
     sources = json.loads(row[5]) if row[5] else []
-    return {
+    payload = {
         "id": row[0],
         "thread_id": row[1],
         "topic": row[2],
@@ -201,56 +576,55 @@ async def get_history(history_id: int):
         "sources": sources,
         "created_at": row[6],
     }
+    return _cached_json(request, payload, etag=etag, max_age=60)
 
 @app.delete("/history/{history_id}")
 async def delete_history(history_id: int):
     conn = app.state.history_conn
-    async with app.state.history_lock:
+    async with _history_lock():
         await conn.execute("DELETE FROM history WHERE id = ?", (history_id,))
         await conn.commit()
+    app.state.topic_index.remove(history_id)
     return {"status": "ok"}
 
 @app.post("/history/clear")
 async def clear_history():
     conn = app.state.history_conn
-    async with app.state.history_lock:
+    async with _history_lock():
         await conn.execute("DELETE FROM history")
         await conn.commit()
+    app.state.topic_index.clear()
     return {"status": "ok"}
 
-@app.post("/history/followup")
-async def followup_history(request: HistoryFollowupRequest):
+async def _start_from_history(history_id: int, question: str) -> str:
+    """Create a thread for question seeded from a stored report and its research corpus."""
     conn = app.state.history_conn
     async with conn.execute(
-        "SELECT id, thread_id, topic, report, sources FROM history WHERE id = ?",
-        (request.history_id,)
+        "SELECT id, thread_id, topic, report, sources, research_chunks FROM history WHERE id = ?",
+        (history_id,)
     ) as cursor:
         row = await cursor.fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="History not found")
 
     sources = json.loads(row[4]) if row[4] else []
+    # Seed the run with only the parts of the old report and corpus that matter for the
+    # new question; the router then searches just the plan steps this does not cover.
+    chunks = select_relevant(question, json.loads(row[5]) if row[5] else [], k=4)
+    sections = select_relevant(question, split_sections(row[3]), k=3)
+    history_context = "\n\n".join(sections) if sections else _make_summary(row[3], max_len=800)
     graph = app.state.graph
     thread_id = str(uuid.uuid4())
     config = {"configurable": {"thread_id": thread_id}}
 
-    initial_state = {
-        "task": request.question,
-        "plan": [],
-        "research_tasks": [],
-        "research_task": "",
-        "research_chunks": [],
-        "content": "",
-        "critique": "",
-        "human_action": "",
-        "human_feedback": "",
-        "history_context": row[3],
-        "max_revisions": 2,
-        "revision_number": 0,
-        "messages": [],
-        "sources": sources,
-    }
+    initial_state = _initial_state(question, research_chunks=chunks, history_context=history_context, sources=sources)
     await graph.aupdate_state(config, initial_state)
+    recorder.record_event(thread_id, "input", initial_state)
+    return thread_id
+
+@app.post("/history/followup")
+async def followup_history(request: HistoryFollowupRequest):
+    thread_id = await _start_from_history(request.history_id, request.question)
     return {"thread_id": thread_id}
 
 def _make_summary(report: str, max_len: int = 120) -> str:
@@ -261,11 +635,59 @@ def _make_summary(report: str, max_len: int = 120) -> str:
         return text
     return text[:max_len] + "…"
 
+async def _with_heartbeat(events, interval: Optional[float] = None):
+    """Re-yield events from an async iterator, yielding None whenever it is quiet for interval seconds.
+
+    The iterator is drained by a single pump task, so it is never advanced from two tasks.
+    """
+    interval = interval or STREAM_HEARTBEAT_SECONDS
+    queue: asyncio.Queue = asyncio.Queue()
+    end = object()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(end)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if item is end:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+
+def _cprofile_path(thread_id: str) -> str:
+    if not re.fullmatch(r"[\w-]+", thread_id):
+        raise HTTPException(status_code=400, detail="Invalid thread id")
+    return os.path.join(PROFILE_DIR, f"{thread_id}.prof")
+
 @app.get("/stream/{thread_id}")
-async def stream_agent(thread_id: str):
-    """Stream logs via SSE."""
+async def stream_agent(thread_id: str, request: Request, profile: bool = False):
+    """Stream logs via SSE.
+
+    `?profile=1` (or an `X-Profile: 1` header) runs this segment under cProfile; the
+    profile accumulates per thread and is served by /runs/{thread_id}/cprofile.
+    """
     graph = app.state.graph
     config = {"configurable": {"thread_id": thread_id}}
+    if thread_id in app.state.active_streams:
+        raise HTTPException(status_code=409, detail="A stream is already running for this thread")
+    profile = profile or request.headers.get("x-profile", "").lower() in ("1", "true", "yes")
+    profiler = RunProfiler() if profile else None
+    profile_path = _cprofile_path(thread_id) if profile else None
     
     async def event_generator():
         # We want to stream updates. 
@@ -332,26 +754,304 @@ async def stream_agent(thread_id: str):
         # This fits the "Stateless REST + Streamlit" model perfectly.
         # We don't need background tasks in /start or /feedback.
         
-        async for event in graph.astream(None, config=config):
-            # Format event for SSE
-            # event is a dict of node outputs
-            for node_name, node_content in event.items():
-                if isinstance(node_content, dict):
-                    payload = {}
-                    for key in ("content", "critique", "plan", "revision_number", "sources", "task"):
-                        if key in node_content:
-                            payload[key] = node_content[key]
-                else:
-                    payload = node_content
+        if thread_id in app.state.active_streams:
+            # Lost a race with another connection for this thread; no [DONE], so the client retries.
+            yield "data: " + json.dumps({"node": "__busy__", "data": thread_id}) + "\n\n"
+            return
+        app.state.active_streams.add(thread_id)
+        metrics.registry.start_run(thread_id)
+        if profiler is not None:
+            # Copied into the graph's node threads and the heartbeat pump task.
+            current_profiler.set(profiler)
+        try:
+            # A reconnect while the run is parked before human review must not resume it;
+            # only /feedback may move the thread past that point.
+            snapshot = await graph.aget_state(config)
+            if tuple(snapshot.next) == ("human_review_node",):
+                yield "data: " + json.dumps({"node": "__interrupt__", "data": []}) + "\n\n"
+                yield "data: [DONE]\n\n"
+                return
+
+            events = graph.astream(None, config=config)
+            if profiler is not None:
+                events = profiler.iterate(events)
+            async for event in _with_heartbeat(events):
+                if event is None:
+                    # SSE comment: keeps proxies and client read timeouts alive during long nodes.
+                    yield ": keepalive\n\n"
+                    continue
+                # Format event for SSE
+                # event is a dict of node outputs
+                for node_name, node_content in event.items():
+                    if isinstance(node_content, dict):
+                        payload = {}
+                        for key in ("content", "critique", "plan", "review_notes", "revision_number", "sources", "stop_reason", "task"):
+                            if key in node_content:
+                                payload[key] = node_content[key]
+                        if node_content.get("section_drafts"):
+                            payload["sections"] = list(node_content["section_drafts"])
+                    else:
+                        payload = node_content
 
-                # We yield a JSON string
-                data = json.dumps({"node": node_name, "data": payload}, ensure_ascii=False)
+                    # We yield a JSON string
+                    data = json.dumps({"node": node_name, "data": payload}, ensure_ascii=False)
+                    yield f"data: {data}\n\n"
+
+            # The run reached END: write the history row from the final checkpoint,
+            # so the report survives even if the client goes away right now.
+            history_id = await _autosave_finished_thread(graph, config)
+            if history_id is not None:
+                data = json.dumps({"node": "__history__", "data": {"id": history_id}}, ensure_ascii=False)
                 yield f"data: {data}\n\n"
-        
-        # Send a "done" event or similar?
-        yield "data: [DONE]\n\n"
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+            # Send a "done" event or similar?
+            yield "data: [DONE]\n\n"
+        finally:
+            app.state.active_streams.discard(thread_id)
+
+    if profiler is None:
+        return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+    async def profiled_events():
+        try:
+            async for chunk in profiler.iterate(event_generator()):
+                yield chunk
+        finally:
+            profiler.dump(profile_path)
+
+    return StreamingResponse(
+        profiled_events(),
+        media_type="text/event-stream",
+        headers={"X-Profile-Location": f"/runs/{thread_id}/cprofile"},
+    )
 
 # Update /start to NOT run background task, just init.
 # Update /feedback to NOT run background task, just update.
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of node, LLM, search and topic-match counters."""
+    stats = app.state.topic_match_stats
+    lines = [metrics.registry.render_prometheus().rstrip("\n")]
+    lines.append("# HELP research_topic_match_total Topic near-duplicate lookups by outcome.")
+    lines.append("# TYPE research_topic_match_total counter")
+    for outcome in ("lookups", "hits", "served", "refreshed"):
+        lines.append(f'research_topic_match_total{{outcome="{outcome}"}} {stats[outcome]}')
+    lines.append("# HELP research_active_streams Open /stream connections.")
+    lines.append("# TYPE research_active_streams gauge")
+    lines.append(f"research_active_streams {len(app.state.active_streams)}")
+    lines.append("# HELP research_model_latency_ewma_seconds Smoothed chat-model latency per node, used for routing.")
+    lines.append("# TYPE research_model_latency_ewma_seconds gauge")
+    for (node, model), seconds in sorted(nodes.router.latency_snapshot().items()):
+        lines.append(f'research_model_latency_ewma_seconds{{node="{node}",model="{model}"}} {seconds:.6f}')
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/runs/{thread_id}/profile")
+async def run_profile(thread_id: str):
+    """Per-node, per-section latency, token and cost breakdown for one thread."""
+    profile = metrics.registry.thread_profile(thread_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No metrics recorded for this thread")
+    return profile
+
+@app.get("/runs/{thread_id}/cprofile")
+async def run_cprofile(thread_id: str, format: str = "pstats", sort: str = "cumulative", limit: int = 40):
+    """cProfile data from `/stream?profile=1` runs: a pstats file, or a text summary with format=text."""
+    path = _cprofile_path(thread_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No profile recorded for this thread")
+    if format == "text":
+        try:
+            return PlainTextResponse(render_text(path, sort, limit))
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{thread_id}.prof")
+
+def _batch_progress(batch: dict) -> dict:
+    """Aggregate status of a batch: topic counts by status, LLM usage and shared-cache hits."""
+    counts = {status: 0 for status in ("queued", "running", "awaiting_review", "done", "failed", "cancelled")}
+    totals = {"llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0, "search_calls": 0}
+    for item in batch["topics"]:
+        counts[item["status"]] += 1
+        profile = metrics.registry.thread_profile(item["thread_id"])
+        for key in totals:
+            totals[key] += profile["totals"][key] if profile else 0
+    finished = batch["finished_at"] or time.time()
+    return {
+        "batch_id": batch["id"],
+        "total": len(batch["topics"]),
+        "completed": counts["done"] + counts["failed"] + counts["awaiting_review"] + counts["cancelled"],
+        "status": counts,
+        "elapsed_seconds": round(finished - batch["started_at"], 3),
+        "finished": batch["finished_at"] is not None,
+        "totals": totals,
+        "cache": batch["cache"].stats(),
+    }
+
+async def _publish_batch_event(batch: dict, kind: str, data):
+    async with batch["changed"]:
+        batch["events"].append({"type": kind, "data": data})
+        batch["changed"].notify_all()
+
+async def _run_batch_topic(batch: dict, item: dict, semaphore: asyncio.Semaphore):
+    """Drive one topic to END (or to human review) the way /stream and /feedback would."""
+    graph = app.state.graph
+    thread_id = item["thread_id"]
+    config = {"configurable": {"thread_id": thread_id}}
+    report = ""
+    try:
+        async with semaphore:
+            item["status"] = "running"
+            started = time.time()
+            app.state.active_streams.add(thread_id)
+            # Copied into the graph's node threads: every topic of the batch shares one cache.
+            current_cache.set(batch["cache"])
+            try:
+                while True:
+                    metrics.registry.start_run(thread_id)
+                    async for _ in graph.astream(None, config=config):
+                        pass
+                    snapshot = await graph.aget_state(config)
+                    if not snapshot.next or not batch["auto_approve"]:
+                        break
+                    update = {
+                        "human_action": "approve",
+                        "messages": [HumanMessage(content="Human Feedback: approve (batch)")]
+                    }
+                    await graph.aupdate_state(config, update, as_node="human_review_node")
+                    recorder.record_event(thread_id, "feedback", update)
+                values = snapshot.values or {}
+                report = values.get("content", "")
+                item["revisions"] = values.get("revision_number", 0)
+                item["stop_reason"] = values.get("stop_reason", "")
+                if snapshot.next:
+                    item["status"] = "awaiting_review"
+                else:
+                    item["history_id"] = await _autosave_finished_thread(graph, config)
+                    item["status"] = "done"
+            finally:
+                app.state.active_streams.discard(thread_id)
+                item["seconds"] = round(time.time() - started, 3)
+    except asyncio.CancelledError:
+        item["status"] = "cancelled"
+        raise
+    except Exception as e:
+        item["status"] = "failed"
+        item["error"] = str(e)
+    finally:
+        if item["status"] != "cancelled":
+            await _publish_batch_event(batch, "topic", dict(item, report=report))
+
+async def _run_batch(batch: dict):
+    semaphore = asyncio.Semaphore(batch["concurrency"])
+    try:
+        await asyncio.gather(
+            *(_run_batch_topic(batch, item, semaphore) for item in batch["topics"]),
+            return_exceptions=True,
+        )
+    finally:
+        for item in batch["topics"]:
+            if item["status"] in ("queued", "running"):
+                item["status"] = "cancelled"
+        batch["finished_at"] = time.time()
+        await _publish_batch_event(batch, "done", _batch_progress(batch))
+
+@app.post("/batch")
+async def start_batch(request: BatchRequest):
+    """Research many topics at once with bounded concurrency and one shared LLM/search cache.
+
+    With auto_approve the reviewer's verdict is final and every report is saved to history;
+    otherwise each topic stops at human review, to be finished through /feedback + /stream.
+    Follow progress with GET /batch/{batch_id}, or its /stream for results as topics finish.
+    """
+    topics = [t.strip() for t in request.topics if t and t.strip()]
+    if not topics:
+        raise HTTPException(status_code=400, detail="No topics given")
+    if len(topics) > MAX_BATCH_TOPICS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TOPICS} topics per batch")
+
+    graph = app.state.graph
+    items = []
+    for topic in topics:
+        thread_id = str(uuid.uuid4())
+        initial_state = _initial_state(topic, max_revisions=request.max_revisions)
+        await graph.aupdate_state({"configurable": {"thread_id": thread_id}}, initial_state)
+        recorder.record_event(thread_id, "input", initial_state)
+        items.append({
+            "topic": topic, "thread_id": thread_id, "status": "queued", "history_id": None,
+            "revisions": 0, "stop_reason": "", "error": "", "seconds": None,
+        })
+
+    batch = {
+        "id": str(uuid.uuid4()),
+        "topics": items,
+        "auto_approve": request.auto_approve,
+        "concurrency": max(1, min(request.concurrency or BATCH_CONCURRENCY, len(items))),
+        "cache": CallCache(),
+        "events": [],
+        "changed": asyncio.Condition(),
+        "started_at": time.time(),
+        "finished_at": None,
+    }
+    batches = app.state.batches
+    for old_id in [k for k, b in batches.items() if b["finished_at"] is not None][:max(0, len(batches) + 1 - MAX_TRACKED_BATCHES)]:
+        del batches[old_id]
+    batches[batch["id"]] = batch
+    batch["task"] = asyncio.create_task(_run_batch(batch))
+    return {
+        "batch_id": batch["id"],
+        "concurrency": batch["concurrency"],
+        "topics": [{"topic": i["topic"], "thread_id": i["thread_id"]} for i in items],
+    }
+
+def _get_batch(batch_id: str) -> dict:
+    batch = app.state.batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+@app.get("/batch/{batch_id}")
+async def batch_status(batch_id: str):
+    batch = _get_batch(batch_id)
+    return dict(_batch_progress(batch), topics=batch["topics"])
+
+@app.get("/batch/{batch_id}/stream")
+async def stream_batch(batch_id: str):
+    """SSE: a "topic" event with its report as each topic finishes, then "done" with the totals.
+
+    Every connection replays the batch's events from the start, so reconnecting loses nothing.
+    """
+    batch = _get_batch(batch_id)
+
+    async def event_generator():
+        sent = 0
+        while True:
+            async with batch["changed"]:
+                if sent == len(batch["events"]):
+                    try:
+                        await asyncio.wait_for(batch["changed"].wait(), timeout=STREAM_HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                events = batch["events"][sent:]
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                sent += 1
+                if event["type"] == "topic":
+                    event = dict(event, progress=_batch_progress(batch))
+                yield "data: " + json.dumps(event, ensure_ascii=False) + "\n\n"
+                if event["type"] == "done":
+                    yield "data: [DONE]\n\n"
+                    return
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+@app.delete("/batch/{batch_id}")
+async def cancel_batch(batch_id: str):
+    """Stop a batch: running topics are cancelled and queued ones never start."""
+    batch = _get_batch(batch_id)
+    if not batch["task"].done():
+        batch["task"].cancel()
+        await asyncio.gather(batch["task"], return_exceptions=True)
+    return _batch_progress(batch)
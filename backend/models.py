@@ -3,6 +3,8 @@ from typing import Optional, List, Dict
 
 class ResearchRequest(BaseModel):
     topic: str
+    reuse: str = "new"  # 'ask', 'serve', 'refresh' or 'new' when a near-duplicate report exists
+    match_threshold: Optional[float] = None
 
 class FeedbackRequest(BaseModel):
     thread_id: str
@@ -14,7 +16,15 @@ class HistorySaveRequest(BaseModel):
     topic: str
     report: str
     sources: Optional[List[Dict[str, str]]] = None
+    plan: Optional[List[str]] = None
+    research_chunks: Optional[List[str]] = None
 
 class HistoryFollowupRequest(BaseModel):
     history_id: int
     question: str
+
+class BatchRequest(BaseModel):
+    topics: List[str]
+    auto_approve: bool = True  # False parks each topic at human review, to finish via /feedback + /stream
+    max_revisions: int = 2
+    concurrency: Optional[int] = None
@@ -0,0 +1,196 @@
+"""Deterministic stand-ins for the chat model and search backends.
+
+Both fakes derive their latency, output and failures from a seeded RNG keyed by the
+request, so the same workload produces the same run every time.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from agent.prompts import PLANNER_SYSTEM_PROMPT, REVIEWER_PROMPT_TEMPLATE, FINAL_WRITER_PROMPT_TEMPLATE, DIGEST_PROMPT_TEMPLATE
+
+
+class FakeLLMError(RuntimeError):
+    pass
+
+
+class FakeSearchError(RuntimeError):
+    pass
+
+
+def _first_line(template: str) -> str:
+    return template.strip().splitlines()[0]
+
+
+def _rng(seed: int, *parts: str) -> random.Random:
+    digest = hashlib.sha256("\x00".join((str(seed),) + parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def sample_latency(rng: random.Random, mean: float, distribution: str, jitter: float) -> float:
+    """Latency in seconds: "fixed", "uniform" (mean ± jitter*mean) or "lognormal" (sigma=jitter)."""
+    if mean <= 0:
+        return 0.0
+    if distribution == "uniform":
+        return max(0.0, rng.uniform(mean * (1 - jitter), mean * (1 + jitter)))
+    if distribution == "lognormal":
+        return rng.lognormvariate(0, jitter) * mean
+    return mean
+
+
+def _filler(rng: random.Random, tokens: int) -> str:
+    words = ["市场规模", "增长", "竞争格局", "政策", "技术路线", "渗透率", "成本", "需求", "产业链", "风险"]
+    # ~2 characters per token, matching agent.metrics' estimate.
+    return "".join(rng.choice(words) for _ in range(max(1, tokens // 4)))
+
+
+def _between(text: str, start: str, end: str) -> str:
+    head, found, rest = text.partition(start)
+    return rest.split(end, 1)[0].strip() if found else ""
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that recognises the repo's prompts and answers in their expected formats."""
+
+    model_name: str = "fake-chat"
+    latency: float = 0.05
+    latency_distribution: str = "fixed"
+    latency_jitter: float = 0.3
+    output_tokens: int = 200
+    plan_steps: int = 3
+    failure_rate: float = 0.0
+    revise_rate: float = 0.0
+    seed: int = 0
+    stream_chunk_chars: int = 8
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _reply(self, messages) -> tuple:
+        text = "\n".join(str(m.content) for m in messages)
+        rng = _rng(self.seed, text)
+        delay = sample_latency(rng, self.latency, self.latency_distribution, self.latency_jitter)
+        if rng.random() < self.failure_rate:
+            return delay, None
+        first = str(messages[0].content)
+        if first.startswith(_first_line(PLANNER_SYSTEM_PROMPT)):
+            plan = [f"步骤{i + 1}：{_filler(rng, 12)}" for i in range(self.plan_steps)]
+            return delay, json.dumps({"plan": plan}, ensure_ascii=False)
+        last = str(messages[-1].content)
+        if last.startswith(_first_line(REVIEWER_PROMPT_TEMPLATE)):  # also the diff-review prompt
+            if rng.random() < self.revise_rate:
+                # Reviews usually point at one section, which lets the writer redo only that one.
+                return delay, f"REVISE: 第{rng.randint(1, self.plan_steps)}节需要补充{_filler(rng, 8)}相关数据"
+            return delay, "APPROVE"
+        if last.startswith(_first_line(DIGEST_PROMPT_TEMPLATE)):
+            # Roughly the condensation a real digest achieves on search snippets.
+            facts = [f"- {_filler(rng, 16)} [S{i % 5 + 1}]" for i in range(max(1, len(last) // 150))]
+            return delay, "\n".join(facts)
+        body = _filler(rng, self.output_tokens)
+        if last.startswith(_first_line(FINAL_WRITER_PROMPT_TEMPLATE)):
+            # Like a real editor: keep the section drafts and list the sources it was given.
+            sections = _between(last, "章节草稿：\n", "\n\n资料来源") or body
+            references = _between(last, "资料来源（标题 + URL）：\n", "\n\n人工反馈")
+            return delay, f"# 研报\n\n{sections}\n\n## 参考来源\n{references}"
+        return delay, body
+
+    def _message(self, messages, content: str, cls=AIMessage, **kwargs):
+        input_tokens = sum(len(str(m.content)) for m in messages) // 2 + 1
+        usage = {
+            "input_tokens": input_tokens,
+            "output_tokens": len(content) // 2 + 1,
+            "total_tokens": input_tokens + len(content) // 2 + 1,
+        }
+        return cls(content=content, usage_metadata=usage, **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        delay, content = self._reply(messages)
+        time.sleep(delay)
+        if content is None:
+            raise FakeLLMError("injected chat-model failure")
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, content))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, content = self._reply(messages)
+        if content is None:
+            time.sleep(delay)
+            raise FakeLLMError("injected chat-model failure")
+        pieces = [content[i:i + self.stream_chunk_chars] for i in range(0, len(content), self.stream_chunk_chars)]
+        for piece in pieces:
+            time.sleep(delay / max(1, len(pieces)))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+
+class FakeSearch:
+    """Search backend returning Tavily-shaped results; also usable as the DuckDuckGo fallback."""
+
+    provider = "fake-search"
+
+    def __init__(
+        self,
+        latency: float = 0.02,
+        latency_distribution: str = "fixed",
+        latency_jitter: float = 0.3,
+        results_per_query: int = 6,
+        snippet_tokens: int = 60,
+        failure_rate: float = 0.0,
+        duplicate_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.latency_jitter = latency_jitter
+        self.results_per_query = results_per_query
+        self.snippet_tokens = snippet_tokens
+        self.failure_rate = failure_rate
+        self.duplicate_rate = duplicate_rate
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def __call__(self, query: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.calls += 1
+        rng = _rng(self.seed, "search", query)
+        time.sleep(sample_latency(rng, self.latency, self.latency_distribution, self.latency_jitter))
+        if rng.random() < self.failure_rate:
+            raise FakeSearchError("injected search failure")
+        results = []
+        for i in range(self.results_per_query):
+            if rng.random() < self.duplicate_rate:
+                # A syndicated copy of one of a few widely reposted articles, shared across queries.
+                article = rng.randrange(20)
+                text = _filler(_rng(self.seed, "article", str(article)), self.snippet_tokens)
+                results.append({
+                    "title": f"转载{article}-{rng.randrange(100)}",
+                    "url": f"https://mirror{rng.randrange(5)}.example.com/{article}" if rng.random() < 0.5 else "",
+                    "content": text + rng.choice(["", "（转载）", "。"]),
+                })
+                continue
+            doc = rng.randrange(10_000)
+            results.append({
+                "title": f"{query[:20]} 资料{doc}",
+                "url": f"https://example.com/doc/{doc}",
+                "content": _filler(rng, self.snippet_tokens),
+            })
+        return results
+
+    def run(self, query: str) -> str:
+        results = self(query)
+        return "\n".join(f"- {r['title']}：{r['content']}" for r in results)
+
+
+def fake_backends(config: Optional[Dict[str, Any]] = None) -> tuple:
+    """(chat_model, search) from a flat config dict such as the benchmark CLI produces."""
+    config = config or {}
+    chat = FakeChatModel(**{k[4:]: v for k, v in config.items() if k.startswith("llm_")})
+    search = FakeSearch(**{k[7:]: v for k, v in config.items() if k.startswith("search_")})
+    return chat, search
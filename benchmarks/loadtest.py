@@ -0,0 +1,341 @@
+"""HTTP load test of the FastAPI backend.
+
+Each simulated user runs full report lifecycles: POST /start → GET /stream (until the
+human-review interrupt) → think → POST /feedback (reject or approve) → GET /stream ...
+until the report is saved, then reads it back via /history/list and /history/{id}.
+The user count is stepped up level by level to find where latency collapses.
+
+By default the backend runs in this process on a local uvicorn, with FakeChatModel and
+FakeSearch and throwaway SQLite files; --url targets an already running server instead
+(which then uses whatever LLM and search it was started with).
+
+    python -m benchmarks.loadtest --users 1,8,32 --think-time 2 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fakes import fake_backends, sample_latency
+from benchmarks.run_benchmark import git_revision, percentile
+
+
+def start_local_server(args) -> str:
+    """Serve backend.main on a free port from a background thread, with fake backends."""
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ["CHECKPOINT_DB"] = os.path.join(workdir, "checkpoints.sqlite")
+    os.environ["HISTORY_DB"] = os.path.join(workdir, "history.sqlite")
+    os.environ.setdefault("DASHSCOPE_API_KEY", "offline-loadtest")
+
+    import uvicorn
+    from agent import nodes
+    from backend.main import app
+
+    chat, search = fake_backends({
+        "llm_latency": args.llm_latency,
+        "llm_latency_distribution": "lognormal",
+        "llm_revise_rate": args.revise_rate,
+        "llm_seed": args.seed,
+        "search_latency": args.search_latency,
+        "search_seed": args.seed,
+    })
+    nodes.configure(chat_model=chat, search=search)
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("local uvicorn did not start")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+class Recorder:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.lifecycles: List[Dict[str, float]] = []
+
+    def observe(self, endpoint: str, seconds: float, ok: bool = True):
+        self.latency[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    async def call(self, endpoint: str, request) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            resp = await request
+        except httpx.HTTPError:
+            self.observe(endpoint, time.perf_counter() - start, ok=False)
+            return None
+        self.observe(endpoint, time.perf_counter() - start, ok=resp.status_code < 400)
+        return resp if resp.status_code < 400 else None
+
+    def summary(self) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, values in sorted(self.latency.items()):
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "error_rate": self.errors[endpoint] / len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": max(values),
+            }
+        return endpoints
+
+
+async def consume_stream(client: httpx.AsyncClient, rec: Recorder, thread_id: str, timeout: float) -> Dict[str, Any]:
+    """Read one /stream response to [DONE]; returns the nodes seen and any saved history id."""
+    start = time.perf_counter()
+    first = None
+    nodes, history_id, done = [], None, False
+    try:
+        async with client.stream("GET", f"/stream/{thread_id}", timeout=timeout) as resp:
+            if resp.status_code >= 400:
+                rec.observe("GET /stream", time.perf_counter() - start, ok=False)
+                return {"ok": False}
+            async for line in resp.aiter_lines():
+                if not line.startswith("data: "):
+                    continue  # blank separators and ": keepalive" comments
+                if first is None:
+                    first = time.perf_counter() - start
+                    rec.observe("stream first event", first)
+                data = line[6:]
+                if data == "[DONE]":
+                    done = True
+                    break
+                event = json.loads(data)
+                nodes.append(event.get("node"))
+                if event.get("node") == "__history__":
+                    history_id = event["data"]["id"]
+    except httpx.HTTPError:
+        done = False
+    rec.observe("GET /stream", time.perf_counter() - start, ok=done)
+    return {"ok": done, "nodes": nodes, "history_id": history_id}
+
+
+async def lifecycle(client: httpx.AsyncClient, rec: Recorder, rng: random.Random, args) -> None:
+    started = time.perf_counter()
+    thinking = 0.0
+    topic = f"负载测试主题 {uuid.uuid4().hex[:8]}"
+    resp = await rec.call("POST /start", client.post("/start", json={"topic": topic, "reuse": "new"}))
+    if resp is None:
+        return
+    thread_id = resp.json()["thread_id"]
+    rejections = 0
+    history_id = None
+    while True:
+        result = await consume_stream(client, rec, thread_id, args.stream_timeout)
+        if not result["ok"]:
+            return
+        if result["history_id"] is not None or "__interrupt__" not in result["nodes"]:
+            history_id = result["history_id"]
+            break
+        pause = sample_latency(rng, args.think_time, "lognormal", 0.5)
+        thinking += pause
+        await asyncio.sleep(pause)
+        if rejections < args.max_rejections and rng.random() < args.reject_rate:
+            rejections += 1
+            body = {"thread_id": thread_id, "action": "reject", "feedback": "请补充更多数据来源"}
+        else:
+            body = {"thread_id": thread_id, "action": "approve"}
+        if await rec.call("POST /feedback", client.post("/feedback", json=body)) is None:
+            return
+    if history_id is not None:
+        await rec.call("GET /history/list", client.get("/history/list", params={"limit": 20}))
+        await rec.call("GET /history/{id}", client.get(f"/history/{history_id}"))
+    total = time.perf_counter() - started
+    rec.lifecycles.append({"seconds": total, "active_seconds": total - thinking, "rejections": rejections})
+
+
+_SAMPLE = re.compile(r'^(\w+)\{([^}]*)\} (\S+)$')
+
+
+def lock_wait_snapshot(text: str) -> Dict[str, Dict[str, float]]:
+    """{lock: {"le=<bound>": cumulative count, "sum": s, "count": n}} from a /metrics page."""
+    locks: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match or not match.group(1).startswith("research_lock_wait_seconds"):
+            continue
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2)))
+        kind = match.group(1).rsplit("_", 1)[1]
+        key = f"le={labels['le']}" if kind == "bucket" else kind
+        locks[labels["lock"]][key] = float(match.group(3))
+    return locks
+
+
+def lock_wait_delta(before, after) -> Dict[str, Dict[str, float]]:
+    result = {}
+    for lock, series in after.items():
+        prev = before.get(lock, {})
+        delta = {k: v - prev.get(k, 0.0) for k, v in series.items()}
+        count = delta.get("count", 0.0)
+        if not count:
+            continue
+
+        def quantile(q: float) -> float:
+            # Upper bound of the first bucket holding the q-th observation.
+            for key, cumulative in sorted(
+                ((k, v) for k, v in delta.items() if k.startswith("le=") and k != "le=+Inf"),
+                key=lambda kv: float(kv[0][3:]),
+            ):
+                if cumulative >= q * count:
+                    return float(key[3:])
+            return float("inf")
+
+        result[lock] = {
+            "acquisitions": int(count),
+            "mean": delta.get("sum", 0.0) / count,
+            "p95_le": quantile(0.95),
+            "p99_le": quantile(0.99),
+        }
+    return result
+
+
+async def run_level(base_url: str, users: int, args, level_seed: int) -> Dict[str, Any]:
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=users * 2 + 4, max_keepalive_connections=users * 2 + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        before = lock_wait_snapshot((await client.get("/metrics")).text)
+
+        async def user(index: int):
+            rng = random.Random(level_seed * 1000 + index)
+            # Stagger arrivals so the first requests don't all land in the same tick.
+            await asyncio.sleep(rng.uniform(0, args.ramp_up))
+            for _ in range(args.lifecycles):
+                await lifecycle(client, rec, rng, args)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(users)))
+        wall = time.perf_counter() - started
+        after = lock_wait_snapshot((await client.get("/metrics")).text)
+
+    attempted = users * args.lifecycles
+    completed = [c["seconds"] for c in rec.lifecycles]
+    active = [c["active_seconds"] for c in rec.lifecycles]
+    requests = sum(len(v) for k, v in rec.latency.items() if k != "stream first event")
+    errors = sum(rec.errors.values())
+    return {
+        "users": users,
+        "wall_seconds": wall,
+        "lifecycles": {
+            "attempted": attempted,
+            "completed": len(completed),
+            "per_minute": len(completed) / wall * 60 if wall else 0.0,
+            "p50": percentile(completed, 50),
+            "p95": percentile(completed, 95),
+            "active_p50": percentile(active, 50),
+            "active_p95": percentile(active, 95),
+            "mean_rejections": statistics.fmean(c["rejections"] for c in rec.lifecycles) if completed else 0.0,
+        },
+        "error_rate": errors / requests if requests else 0.0,
+        "endpoints": rec.summary(),
+        "lock_wait": lock_wait_delta(before, after),
+    }
+
+
+def find_knee(levels: List[Dict[str, Any]], factor: float, max_error_rate: float) -> Optional[int]:
+    """First user count whose active-time p95 exceeds factor × the lowest level's, or that errors too often."""
+    if not levels:
+        return None
+    baseline = levels[0]["lifecycles"]["active_p95"] or float("inf")
+    for level in levels:
+        if level["error_rate"] > max_error_rate or level["lifecycles"]["active_p95"] > factor * baseline:
+            return level["users"]
+    return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target a running backend instead of an in-process one")
+    parser.add_argument("--users", default="1,4,16", help="comma-separated concurrent user counts")
+    parser.add_argument("--lifecycles", type=int, default=2, help="report lifecycles per user per level")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds before each review decision")
+    parser.add_argument("--reject-rate", type=float, default=0.3)
+    parser.add_argument("--max-rejections", type=int, default=2)
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="spread user start times over this many seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="in-process only: mean fake LLM latency")
+    parser.add_argument("--search-latency", type=float, default=0.1, help="in-process only: fake search latency")
+    parser.add_argument("--revise-rate", type=float, default=0.3, help="in-process only: reviewer REVISE share")
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--stream-timeout", type=float, default=120.0)
+    parser.add_argument("--collapse-factor", type=float, default=3.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    out = sys.stdout
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        # The in-process nodes print progress from the server thread; keep the report readable.
+        sys.stdout = open(os.devnull, "w")
+        base_url = start_local_server(args)
+
+    levels = []
+    for i, users in enumerate(int(x) for x in args.users.split(",")):
+        level = await run_level(base_url, users, args, args.seed + i)
+        levels.append(level)
+        life = level["lifecycles"]
+        ttfe = level["endpoints"].get("stream first event", {})
+        history_wait = level["lock_wait"].get("history", {})
+        checkpoint_wait = level["lock_wait"].get("checkpoint", {})
+        print(
+            f"users={users:<4} done={life['completed']}/{life['attempted']} "
+            f"lifecycle p50={life['p50']:.2f}s p95={life['p95']:.2f}s active p95={life['active_p95']:.2f}s "
+            f"ttfe p95={ttfe.get('p95', 0.0):.3f}s errors={level['error_rate']:.1%} "
+            f"history lock mean={history_wait.get('mean', 0.0) * 1000:.1f}ms "
+            f"checkpoint lock mean={checkpoint_wait.get('mean', 0.0) * 1000:.1f}ms "
+            f"p95<={checkpoint_wait.get('p95_le', 0.0) * 1000:.0f}ms",
+            file=out,
+            flush=True,
+        )
+        for endpoint, stats in level["endpoints"].items():
+            print(
+                f"    {endpoint:<20} n={stats['requests']:<5} p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s "
+                f"p99={stats['p99']:.3f}s errors={stats['errors']}",
+                file=out,
+            )
+
+    knee = find_knee(levels, args.collapse_factor, args.max_error_rate)
+    print(f"latency collapse at users={knee}" if knee else "no latency collapse in the tested range", file=out)
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "target": args.url or "in-process",
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "knee_users": knee,
+        "levels": levels,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Re-run a recorded thread against its captured LLM and search I/O.
+
+Record threads by starting the backend with RECORD_DIR set; each thread is written
+to RECORD_DIR/<thread_id>.jsonl.gz. Replaying runs the current node code offline,
+feeding it the recorded answers and human feedback, and prints a per-node profile:
+
+    python -m benchmarks.replay recordings/<thread_id>.jsonl.gz            # original timing
+    python -m benchmarks.replay recordings/<thread_id>.jsonl.gz --speed 0  # as fast as possible
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import time
+import uuid
+
+os.environ.setdefault("DASHSCOPE_API_KEY", "offline-replay")
+
+from langgraph.checkpoint.memory import MemorySaver  # noqa: E402
+
+from agent import metrics, nodes  # noqa: E402
+from agent.graph import build_graph  # noqa: E402
+from agent.recording import Recording  # noqa: E402
+
+
+async def replay(recording: Recording) -> dict:
+    # Process-wide: every graph in this process now answers from the recording.
+    nodes.configure(chat_model=recording.chat_model(), search=recording.search())
+    graph = build_graph(MemorySaver())
+    thread_id = str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    feedback = recording.feedback
+    started = time.perf_counter()
+
+    await graph.aupdate_state(config, recording.initial_state)
+    while True:
+        metrics.registry.start_run(thread_id)
+        async for _ in graph.astream(None, config=config):
+            pass
+        snapshot = await graph.aget_state(config)
+        if not snapshot.next:
+            break
+        # Parked before human review: apply the next recorded decision, approving once they run out.
+        update = feedback.pop(0) if feedback else {"human_action": "approve"}
+        await graph.aupdate_state(config, update, as_node="human_review_node")
+
+    return {
+        "seconds": time.perf_counter() - started,
+        "mismatches": recording.mismatches,
+        "misses": recording.misses,
+        "revisions": snapshot.values.get("revision_number", 0),
+        "report": snapshot.values.get("content", ""),
+        "profile": metrics.registry.thread_profile(thread_id),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="a <thread_id>.jsonl.gz file written under RECORD_DIR")
+    parser.add_argument("--speed", type=float, default=1.0, help="latency multiplier; 0 for no delays")
+    parser.add_argument("--strict", action="store_true", help="fail when a node makes more calls than recorded")
+    parser.add_argument("--output", help="write the profile and final report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep node print output")
+    args = parser.parse_args()
+
+    recording = Recording.load(args.recording, speed=args.speed, strict=args.strict)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        result = asyncio.run(replay(recording))
+
+    totals = result["profile"]["totals"]
+    print(
+        f"replayed in {result['seconds']:.2f}s: {totals['llm_calls']} LLM calls, {totals['search_calls']} searches, "
+        f"{result['revisions']} revisions, {result['mismatches']} prompt mismatches, {result['misses']} misses"
+    )
+    for node in result["profile"]["nodes"]:
+        print(
+            f"    {node['node']:<16} calls={node['calls']:<3} seconds={node['seconds']:.3f} "
+            f"llm={node['llm_seconds']:.3f} search={node['search_seconds']:.3f} tokens={node['input_tokens']}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Offline end-to-end benchmark of the research graph.
+
+Runs the full planner → research → write → review → (auto-approved) human review
+pipeline against FakeChatModel/FakeSearch, across topic counts and concurrency levels,
+and writes a JSON report that can be diffed between versions:
+
+    python -m benchmarks.run_benchmark --topics 1,8 --concurrency 1,4 --output bench.json
+    python -m benchmarks.run_benchmark --compare bench.json
+
+Per-node model routing is exercised with named stand-in models (name:latency[:failure_rate]):
+
+    python -m benchmarks.run_benchmark --models fast:0.02,main:0.05:0.1 \
+        --routes "planner=fast,main;reviewer=fast,main;default=main,fast"
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import uuid
+from typing import Any, Dict, List
+
+os.environ.setdefault("DASHSCOPE_API_KEY", "offline-benchmark")
+
+from langgraph.checkpoint.memory import MemorySaver  # noqa: E402
+
+from agent import metrics  # noqa: E402
+from agent import nodes as agent_nodes  # noqa: E402
+from agent.graph import build_graph  # noqa: E402
+from agent.routing import parse_routes  # noqa: E402
+from benchmarks.fakes import fake_backends  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def initial_state(topic: str, max_revisions: int) -> Dict[str, Any]:
+    return {
+        "task": topic,
+        "plan": [],
+        "research_tasks": [],
+        "research_task": "",
+        "research_chunks": [],
+        "content": "",
+        "critique": "",
+        "human_action": "",
+        "human_feedback": "",
+        "history_context": "",
+        "max_revisions": max_revisions,
+        "revision_number": 0,
+        "messages": [],
+        "sources": [],
+    }
+
+
+async def run_topic(graph, topic: str, max_revisions: int) -> Dict[str, Any]:
+    thread_id = str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    started = time.perf_counter()
+    metrics.registry.start_run(thread_id)
+    first_event = None
+    async for _ in graph.astream(initial_state(topic, max_revisions), config=config):
+        first_event = first_event or time.perf_counter() - started
+    await graph.aupdate_state(config, {"human_action": "approve"}, as_node="human_review_node")
+    metrics.registry.start_run(thread_id)
+    async for _ in graph.astream(None, config=config):
+        pass
+    snapshot = await graph.aget_state(config)
+    return {
+        "thread_id": thread_id,
+        "seconds": time.perf_counter() - started,
+        "time_to_first_event": first_event or 0.0,
+        "revisions": snapshot.values.get("revision_number", 0),
+        "finished": not snapshot.next,
+    }
+
+
+async def run_scenario(graph, topics: int, concurrency: int, max_revisions: int, same_topic: bool = False) -> Dict[str, Any]:
+    metrics.registry.reset()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(i: int):
+        async with semaphore:
+            return await run_topic(graph, f"基准测试主题 {0 if same_topic else i}", max_revisions)
+
+    started = time.perf_counter()
+    runs = await asyncio.gather(*(bounded(i) for i in range(topics)))
+    wall = time.perf_counter() - started
+
+    nodes: Dict[str, Dict[str, float]] = {}
+    totals = {
+        "llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0, "search_calls": 0,
+        "snippets": 0, "duplicate_snippets": 0,
+    }
+    for run in runs:
+        profile = metrics.registry.thread_profile(run["thread_id"]) or {"nodes": [], "totals": {}}
+        for key in totals:
+            totals[key] += profile["totals"].get(key, 0)
+        for node in profile["nodes"]:
+            item = nodes.setdefault(node["node"], {"calls": 0, "seconds": 0.0, "queue_wait": 0.0, "llm_calls": 0})
+            for key in item:
+                item[key] += node[key]
+    for item in nodes.values():
+        item["mean_seconds"] = item["seconds"] / item["calls"] if item["calls"] else 0.0
+
+    latencies = [r["seconds"] for r in runs]
+    return {
+        "topics": topics,
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "throughput_per_minute": topics / wall * 60 if wall else 0.0,
+        "latency": {
+            "mean": statistics.fmean(latencies),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies),
+        },
+        "time_to_first_event_p50": percentile([r["time_to_first_event"] for r in runs], 50),
+        "finished": sum(1 for r in runs if r["finished"]),
+        "mean_revisions": statistics.fmean(r["revisions"] for r in runs),
+        "totals": totals,
+        "nodes": nodes,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    lines = []
+    base = {(s["topics"], s["concurrency"]): s for s in baseline.get("scenarios", [])}
+    for scenario in current["scenarios"]:
+        old = base.get((scenario["topics"], scenario["concurrency"]))
+        if not old:
+            continue
+        for label, new_value, old_value in (
+            ("p50", scenario["latency"]["p50"], old["latency"]["p50"]),
+            ("p95", scenario["latency"]["p95"], old["latency"]["p95"]),
+            ("throughput/min", scenario["throughput_per_minute"], old["throughput_per_minute"]),
+            ("llm_calls", scenario["totals"]["llm_calls"], old["totals"]["llm_calls"]),
+            ("input_tokens", scenario["totals"]["input_tokens"], old["totals"]["input_tokens"]),
+        ):
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            lines.append(
+                f"topics={scenario['topics']:<3} conc={scenario['concurrency']:<3} {label:<15} "
+                f"{old_value:>10.3f} -> {new_value:>10.3f} ({change:+.1f}%)"
+            )
+    return lines
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", default="1,4", help="comma-separated topic counts")
+    parser.add_argument("--concurrency", default="1,4", help="comma-separated concurrency levels")
+    parser.add_argument("--max-revisions", type=int, default=2)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="mean seconds per chat call")
+    parser.add_argument("--llm-distribution", default="lognormal", choices=("fixed", "uniform", "lognormal"))
+    parser.add_argument("--llm-jitter", type=float, default=0.3)
+    parser.add_argument("--llm-output-tokens", type=int, default=200)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--revise-rate", type=float, default=0.3, help="share of reviews that ask for a rewrite")
+    parser.add_argument("--plan-steps", type=int, default=3)
+    parser.add_argument("--search-latency", type=float, default=0.02)
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--search-duplicate-rate", type=float, default=0.0,
+                        help="share of search results that are syndicated copies of a shared article")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--models", help="stand-in chat models for routing, as name:latency[:failure_rate],...")
+    parser.add_argument("--routes", default="", help="MODEL_ROUTES-style node=model,fallback;... over --models")
+    parser.add_argument("--same-topic", action="store_true", help="every run researches the same (hot) topic")
+    parser.add_argument("--mode", choices=("staged", "pipelined"), help="graph pipeline mode (default: PIPELINE_MODE)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report to diff against")
+    parser.add_argument("--verbose", action="store_true", help="keep node print output")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    config = {
+        "llm_latency": args.llm_latency,
+        "llm_latency_distribution": args.llm_distribution,
+        "llm_latency_jitter": args.llm_jitter,
+        "llm_output_tokens": args.llm_output_tokens,
+        "llm_failure_rate": args.llm_failure_rate,
+        "llm_revise_rate": args.revise_rate,
+        "llm_plan_steps": args.plan_steps,
+        "llm_seed": args.seed,
+        "search_latency": args.search_latency,
+        "search_failure_rate": args.search_failure_rate,
+        "search_duplicate_rate": args.search_duplicate_rate,
+        "search_seed": args.seed,
+    }
+    chat, search = fake_backends(config)
+    models = None
+    if args.models:
+        models = {}
+        for spec in args.models.split(","):
+            name, latency, *failure = spec.split(":")
+            failure_rate = float(failure[0]) if failure else 0.0
+            models[name] = chat.model_copy(update={"model_name": name, "latency": float(latency), "failure_rate": failure_rate})
+        config["models"] = args.models
+        config["routes"] = args.routes
+    for model in (models or {chat.model_name: chat}).values():
+        metrics.registry.prices.setdefault(model.model_name, metrics.DEFAULT_PRICES["deepseek-v3.1"])
+    routes = parse_routes(args.routes, default=list(models)[:1]) if models else None
+    # Process-wide swap; this script builds its only graph afterwards.
+    if models:
+        agent_nodes.configure(search=search, models=models, routes=routes)
+    else:
+        agent_nodes.configure(chat_model=chat, search=search)
+    graph = build_graph(MemorySaver(), mode=args.mode)
+
+    scenarios = []
+    for topics in [int(x) for x in args.topics.split(",")]:
+        for concurrency in [int(x) for x in args.concurrency.split(",")]:
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with quiet:
+                result = await run_scenario(graph, topics, concurrency, args.max_revisions, args.same_topic)
+            scenarios.append(result)
+            print(
+                f"topics={topics:<3} conc={concurrency:<3} wall={result['wall_seconds']:.2f}s "
+                f"p50={result['latency']['p50']:.2f}s p95={result['latency']['p95']:.2f}s "
+                f"thr={result['throughput_per_minute']:.1f}/min llm_calls={result['totals']['llm_calls']}"
+            )
+
+    if models:
+        for (node, model), seconds in sorted(agent_nodes.router.latency_snapshot().items()):
+            print(f"latency ewma {node:<16} {model:<10} {seconds:.3f}s")
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "config": dict(config, max_revisions=args.max_revisions, mode=args.mode, same_topic=args.same_topic),
+        },
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n".join(compare(report, json.load(f))))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,35 @@
 import json
 import http.client
 import html
+import queue
+import threading
+import time
+from collections import OrderedDict
 import requests
 import sseclient
 import streamlit as st
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ChunkedEncodingError, RequestException
+from urllib3.util.retry import Retry
 
 BASE_URL = "http://localhost:8000"
+HISTORY_CACHE_TTL = 30
+HISTORY_DETAIL_CACHE_SIZE = 32
+RAW_LOG_MAX_LEN = 2000
+STREAM_READ_TIMEOUT = 60
+STREAM_MAX_RETRIES = 5
+# Log entries rendered individually: the newest LOG_TAIL_ENTRIES on a full rerun and the newest
+# LIVE_LOG_MAX_ENTRIES in the live fragment. Older ones are folded away, so a rerun costs the
+# same however long the run has been going.
+LOG_TAIL_ENTRIES = 50
+LIVE_LOG_MAX_ENTRIES = 20
+HISTORY_PAGE_SIZE = 20
+# Why the revision loop ended early, by the reviewer's stop_reason ("approved" needs no note).
+STOP_REASONS = {
+    "max_revisions": "已达修订上限",
+    "draft_converged": "修订后内容基本不变，提前结束",
+    "critique_repeated": "评审意见重复，提前结束",
+}
 
 st.set_page_config(page_title="研报生成系统", layout="wide")
 st.markdown(
@@ -132,9 +155,7 @@ def render_snippet(text: str, max_len: int = 260) -> str:
     return html.escape(short_text(compact, max_len))
 
 
-def format_log(node: str, payload, raw: bool = False) -> str:
-    if raw:
-        return f"{node}: {json.dumps(payload, ensure_ascii=False)}"
+def format_log(node: str, payload) -> str:
     if isinstance(payload, dict):
         if node == "planner":
             plan = payload.get("plan", [])
@@ -145,57 +166,184 @@ def format_log(node: str, payload, raw: bool = False) -> str:
         if node == "researcher":
             summary = payload.get("content", "")
             return f"检索完成：\n{short_text(summary, 400)}"
-        if node == "writer":
+        if node == "research_digest":
+            return "检索资料已整理为事实清单。"
+        if node == "section_pipeline":
+            sections = "、".join(payload.get("sections", []))
+            return f"章节检索与初稿完成：{sections}"
+        if node in ("writer", "integrator"):
             content = payload.get("content", "")
             return f"写作完成：约 {len(content)} 字。"
         if node == "reviewer":
             critique = payload.get("critique", "")
+            reason = STOP_REASONS.get(payload.get("stop_reason", ""))
+            notes = payload.get("review_notes", "")
+            if reason and notes:
+                return f"评审意见：{critique}（{reason}，仍待处理：{notes}）"
+            if reason:
+                return f"评审意见：{critique}（{reason}）"
             return f"评审意见：{critique}"
         if node == "human_review_node":
             return "进入人工审核节点。"
-    return str(payload)
+        if node == "__history__":
+            return "研报已自动保存到历史记录。"
+    return short_text(str(payload), 240)
+
+
+def make_log_entry(node: str, payload, raw: bool = False) -> dict:
+    entry = {"text": f"【{node}】{format_log(node, payload)}", "raw": ""}
+    if raw:
+        entry["raw"] = short_text(json.dumps(payload, ensure_ascii=False), RAW_LOG_MAX_LEN)
+    return entry
+
+
+def render_log_entry(container, entry: dict):
+    # Each entry gets its own elements, so a new event appends instead of re-rendering the log.
+    container.markdown(f"- {entry['text']}")
+    if entry.get("raw"):
+        with container.expander("原始数据", expanded=False):
+            st.code(entry["raw"], language="json")
+
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    # One keep-alive pool per server process instead of new TCP connections on every rerun.
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "DELETE"}),
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
-def render_logs(messages):
-    if not messages:
-        return "暂无日志。"
-    return "\n".join([f"- {m}" for m in messages])
+http_session = get_http_session()
 
 
-def fetch_history_list():
+@st.cache_data(ttl=HISTORY_CACHE_TTL, show_spinner=False)
+def _load_history_list(limit: int = HISTORY_PAGE_SIZE, before_id=None):
+    params = {"limit": limit}
+    if before_id is not None:
+        params["before_id"] = before_id
+    resp = http_session.get(f"{BASE_URL}/history/list", params=params)
+    resp.raise_for_status()
+    data = resp.json()
+    return data.get("items", []), data.get("next_before_id")
+
+
+@st.cache_data(ttl=HISTORY_CACHE_TTL, show_spinner=False)
+def _load_history_detail(history_id: int):
+    resp = http_session.get(f"{BASE_URL}/history/{history_id}")
+    resp.raise_for_status()
+    return resp.json()
+
+
+def fetch_history_list(before_id=None):
+    # Failures are not cached, so the next rerun retries.
     try:
-        resp = requests.get(f"{BASE_URL}/history/list", params={"limit": 50})
-        if resp.status_code == 200:
-            return resp.json().get("items", [])
+        return _load_history_list(HISTORY_PAGE_SIZE, before_id)
     except Exception:
-        pass
-    return []
+        return [], None
+
+
+def reload_history():
+    """Load only the first page; older pages are fetched on demand."""
+    items, cursor = fetch_history_list()
+    st.session_state.history_list = items
+    st.session_state.history_cursor = cursor
+    st.session_state.history_page = 0
+
+
+def load_more_history():
+    items, cursor = fetch_history_list(st.session_state.history_cursor)
+    st.session_state.history_list.extend(items)
+    st.session_state.history_cursor = cursor
 
 
 def fetch_history_detail(history_id: int):
+    cached = st.session_state.history_details.get(history_id)
+    if cached is not None:
+        st.session_state.history_details.move_to_end(history_id)
+        return cached
     try:
-        resp = requests.get(f"{BASE_URL}/history/{history_id}")
-        if resp.status_code == 200:
-            return resp.json()
+        detail = _load_history_detail(history_id)
     except Exception:
-        pass
-    return None
+        return None
+    st.session_state.history_details[history_id] = detail
+    while len(st.session_state.history_details) > HISTORY_DETAIL_CACHE_SIZE:
+        st.session_state.history_details.popitem(last=False)
+    return detail
+
+
+def invalidate_history(history_id=None):
+    """Drop cached history after a save/delete/clear; history_id=None drops everything."""
+    _load_history_list.clear()
+    if history_id is None:
+        _load_history_detail.clear()
+        st.session_state.history_details.clear()
+    else:
+        _load_history_detail.clear(history_id)
+        st.session_state.history_details.pop(history_id, None)
 
 
-def save_history(thread_id: str, topic: str, report: str, sources):
-    try:
-        resp = requests.post(
-            f"{BASE_URL}/history/save",
-            json={
-                "thread_id": thread_id,
-                "topic": topic,
-                "report": report,
-                "sources": sources or []
-            }
-        )
-        return resp.status_code == 200
-    except Exception:
-        return False
+class StreamWorker:
+    """Consumes /stream/{thread_id} on a daemon thread and hands events to the UI through a queue.
+
+    Dropped or timed-out connections are retried; /stream resumes the graph from its
+    last checkpoint and never resumes past a pending human review.
+    """
+
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.events = queue.Queue()
+        self.done = threading.Event()
+        self.interrupted = False
+        self.error = ""
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        retries = 0
+        while retries <= STREAM_MAX_RETRIES:
+            finished = False
+            try:
+                response = http_session.get(
+                    f"{BASE_URL}/stream/{self.thread_id}",
+                    stream=True,
+                    headers={"Accept": "text/event-stream"},
+                    timeout=(3, STREAM_READ_TIMEOUT),
+                )
+                try:
+                    response.raise_for_status()
+                    for event in sseclient.SSEClient(response).events():
+                        if event.data == "[DONE]":
+                            finished = True
+                            break
+                        try:
+                            data = json.loads(event.data)
+                        except json.JSONDecodeError:
+                            continue
+                        if data.get("node") == "__busy__":
+                            break
+                        if data.get("node") == "__interrupt__":
+                            self.interrupted = True
+                        self.events.put(data)
+                        retries = 0
+                finally:
+                    response.close()
+            except (ChunkedEncodingError, http.client.IncompleteRead, RequestException) as e:
+                self.error = str(e)
+            if finished:
+                self.error = ""
+                break
+            retries += 1
+            time.sleep(min(2 ** retries, 10))
+        if retries > STREAM_MAX_RETRIES and not self.error:
+            self.error = "连接多次中断"
+        self.done.set()
 
 
 with st.sidebar:
@@ -224,77 +372,149 @@ if "final_report" not in st.session_state:
     st.session_state.final_report = ""
 if "sources" not in st.session_state:
     st.session_state.sources = []
+if "history_details" not in st.session_state:
+    st.session_state.history_details = OrderedDict()
 if "history_list" not in st.session_state:
-    st.session_state.history_list = fetch_history_list()
+    reload_history()
 if "history_selected_id" not in st.session_state:
     st.session_state.history_selected_id = None
 if "history_view" not in st.session_state:
     st.session_state.history_view = None
-if "history_details" not in st.session_state:
-    st.session_state.history_details = {}
-if "history_saved_ids" not in st.session_state:
-    st.session_state.history_saved_ids = set()
 if "current_topic" not in st.session_state:
     st.session_state.current_topic = ""
 if "display_mode" not in st.session_state:
     st.session_state.display_mode = "current"
+if "topic_match" not in st.session_state:
+    st.session_state.topic_match = None
+if "stream_worker" not in st.session_state:
+    st.session_state.stream_worker = None
+if "stream_error" not in st.session_state:
+    st.session_state.stream_error = ""
+if "log_rendered" not in st.session_state:
+    st.session_state.log_rendered = 0
+if "flash" not in st.session_state:
+    st.session_state.flash = ""
 
 
 if refresh_history:
-    st.session_state.history_list = fetch_history_list()
-    st.session_state.history_details = {}
+    invalidate_history()
+    reload_history()
     st.session_state.history_selected_id = None
     st.session_state.history_view = None
 if clear_history:
     try:
-        resp = requests.post(f"{BASE_URL}/history/clear")
+        resp = http_session.post(f"{BASE_URL}/history/clear")
         if resp.status_code == 200:
+            invalidate_history()
             st.session_state.history_list = []
+            st.session_state.history_cursor = None
+            st.session_state.history_page = 0
             st.session_state.history_selected_id = None
             st.session_state.history_view = None
-            st.session_state.history_details = {}
     except Exception:
         pass
 
-if st.session_state.history_list:
-    for item in st.session_state.history_list:
-        history_id = item.get("id")
-        if not history_id:
-            continue
-        label = f"{(item.get('created_at') or '')[:19]} | {item.get('topic') or ''} | {short_text(item.get('summary') or '', 40)}"
-        if st.sidebar.button(label, key=f"history_btn_{history_id}"):
-            detail = st.session_state.history_details.get(history_id)
-            if detail is None:
-                detail = fetch_history_detail(history_id)
-                if detail:
-                    st.session_state.history_details[history_id] = detail
-            st.session_state.history_selected_id = history_id
-            st.session_state.history_view = detail
-            st.session_state.display_mode = "history"
+def _reset_history_page():
+    st.session_state.history_page = 0
+
+
+history_filter = st.sidebar.text_input("筛选历史记录", key="history_filter", on_change=_reset_history_page).strip().lower()
+if history_filter:
+    visible_history = [
+        item for item in st.session_state.history_list
+        if history_filter in (item.get("topic") or "").lower() or history_filter in (item.get("summary") or "").lower()
+    ]
 else:
-    st.sidebar.caption('暂无历史记录。')
+    visible_history = st.session_state.history_list
+page_count = max(1, -(-len(visible_history) // HISTORY_PAGE_SIZE))
+st.session_state.history_page = min(st.session_state.history_page, page_count - 1)
+page_start = st.session_state.history_page * HISTORY_PAGE_SIZE
+
+# Only the current page becomes widgets, however many reports are loaded.
+for item in visible_history[page_start:page_start + HISTORY_PAGE_SIZE]:
+    history_id = item.get("id")
+    if not history_id:
+        continue
+    label = f"{(item.get('created_at') or '')[:19]} | {item.get('topic') or ''} | {short_text(item.get('summary') or '', 40)}"
+    if st.sidebar.button(label, key=f"history_btn_{history_id}"):
+        detail = fetch_history_detail(history_id)
+        st.session_state.history_selected_id = history_id
+        st.session_state.history_view = detail
+        st.session_state.display_mode = "history"
+if not visible_history:
+    st.sidebar.caption('暂无匹配的历史记录。' if history_filter else '暂无历史记录。')
+
+col_prev, col_page, col_next = st.sidebar.columns([1, 1, 1])
+with col_prev:
+    if st.button("上一页", key="history_prev_btn", disabled=st.session_state.history_page == 0):
+        st.session_state.history_page -= 1
+        st.rerun()
+with col_page:
+    st.caption(f"{st.session_state.history_page + 1} / {page_count}")
+with col_next:
+    has_next = st.session_state.history_page + 1 < page_count or st.session_state.history_cursor is not None
+    if st.button("下一页", key="history_next_btn", disabled=not has_next):
+        if st.session_state.history_page + 1 >= page_count:
+            load_more_history()
+        st.session_state.history_page += 1
+        st.rerun()
 
 if st.session_state.current_content or st.session_state.final_report:
     if st.sidebar.button("查看最新生成", key="view_latest_btn"):
         st.session_state.display_mode = "current"
 
 
-if start_btn:
+start_reuse = "ask" if start_btn else None
+start_topic = topic
+
+if st.session_state.topic_match:
+    pending = st.session_state.topic_match
+    match = pending["match"]
+    st.info(
+        f"发现相似的历史研报：{match.get('topic') or ''}"
+        f"（相似度 {match.get('similarity', 0):.0%}，{(match.get('created_at') or '')[:19]}）"
+    )
+    col_m1, col_m2, col_m3 = st.columns(3)
+    with col_m1:
+        if st.button("查看已有研报", key="match_serve_btn"):
+            start_reuse, start_topic = "serve", pending["topic"]
+    with col_m2:
+        if st.button("基于已有资料增量刷新", key="match_refresh_btn"):
+            start_reuse, start_topic = "refresh", pending["topic"]
+    with col_m3:
+        if st.button("重新研究", key="match_new_btn"):
+            start_reuse, start_topic = "new", pending["topic"]
+
+if start_reuse:
     try:
-        resp = requests.post(f"{BASE_URL}/start", json={"topic": topic})
+        resp = http_session.post(f"{BASE_URL}/start", json={"topic": start_topic, "reuse": start_reuse})
         if resp.status_code == 200:
             data = resp.json()
-            st.session_state.thread_id = data["thread_id"]
-            st.session_state.current_topic = topic
-            st.session_state.messages = []
-            st.session_state.waiting_for_feedback = False
-            st.session_state.current_content = ""
-            st.session_state.finished = False
-            st.session_state.final_report = ""
-            st.session_state.sources = []
-            st.session_state.display_mode = "current"
-            st.success(f"任务已启动，线程 ID：{st.session_state.thread_id}")
-            st.rerun()
+            st.session_state.topic_match = None
+            if data.get("thread_id"):
+                st.session_state.thread_id = data["thread_id"]
+                st.session_state.current_topic = start_topic
+                st.session_state.messages = []
+                st.session_state.waiting_for_feedback = False
+                st.session_state.current_content = ""
+                st.session_state.finished = False
+                st.session_state.final_report = ""
+                st.session_state.sources = []
+                st.session_state.stream_error = ""
+                st.session_state.display_mode = "current"
+                st.success(f"任务已启动，线程 ID：{st.session_state.thread_id}")
+                st.rerun()
+            elif data.get("served"):
+                history_id = data["match"]["id"]
+                st.session_state.history_selected_id = history_id
+                st.session_state.history_view = dict(
+                    data["match"], report=data.get("report", ""), sources=data.get("sources", [])
+                )
+                st.session_state.display_mode = "history"
+                st.rerun()
+            elif data.get("match"):
+                st.session_state.topic_match = {"topic": start_topic, "match": data["match"]}
+                st.rerun()
         else:
             st.error(f"启动失败：{resp.text}")
     except Exception as e:
@@ -326,89 +546,109 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-tab_report, tab_logs, tab_sources = st.tabs(["研报", "执行日志", "资料来源"])
-
-with tab_logs:
-    log_placeholder = st.empty()
-    log_placeholder.markdown(render_logs(st.session_state.messages))
-
-
-if st.session_state.thread_id and not st.session_state.waiting_for_feedback and not st.session_state.finished:
-    with st.spinner("正在生成研报..."):
+def apply_stream_event(data: dict) -> bool:
+    """Fold one SSE event into session state; True if the main view needs a full rerun."""
+    node = data.get("node")
+    payload = data.get("data")
+    st.session_state.messages.append(make_log_entry(node, payload, raw=show_raw_logs))
+    if node in ("writer", "integrator") and isinstance(payload, dict):
+        content = payload.get("content", "")
+        if content:
+            st.session_state.current_content = content
+            st.session_state.final_report = content
+            return True
+    if node == "researcher" and isinstance(payload, dict):
+        sources = payload.get("sources") or []
+        if sources:
+            st.session_state.sources = sources
+            return True
+    if node == "section_pipeline" and isinstance(payload, dict):
+        # Pipelined sections each report their own sources.
+        sources = payload.get("sources") or []
+        if sources:
+            st.session_state.sources = (st.session_state.sources or []) + sources
+            return True
+    if node == "__history__":
+        invalidate_history((payload or {}).get("id"))
+        reload_history()
+        return True
+    return False
+
+
+@st.fragment(run_every=1.0)
+def stream_progress():
+    # Polls the worker queue so the rest of the page stays interactive during a run.
+    worker = st.session_state.stream_worker
+    if worker is None:
+        return
+    needs_rerun = False
+    while True:
         try:
-            messages = st.session_state.messages
-            needs_feedback = False
-            url = f"{BASE_URL}/stream/{st.session_state.thread_id}"
-            response = requests.get(
-                url,
-                stream=True,
-                headers={"Accept": "text/event-stream"},
-                timeout=(3, 120),
-            )
-            client = sseclient.SSEClient(response)
-            had_events = False
-
-            try:
-                for event in client.events():
-                    had_events = True
-                    if event.data == "[DONE]":
-                        break
-
-                    try:
-                        data = json.loads(event.data)
-                        node = data.get("node")
-                        payload = data.get("data")
-
-                        log_text = format_log(node, payload, raw=show_raw_logs)
-                        messages.append(f"【{node}】{log_text}")
-                        log_placeholder.markdown(render_logs(messages))
-
-                        if node == "writer" and isinstance(payload, dict):
-                            content = payload.get("content", "")
-                            if content:
-                                st.session_state.current_content = content
-                                st.session_state.final_report = content
-                        if node == "researcher" and isinstance(payload, dict):
-                            sources = payload.get("sources") or []
-                            if sources:
-                                st.session_state.sources = sources
-                        if node == "__interrupt__":
-                            needs_feedback = True
-
-                    except json.JSONDecodeError:
-                        pass
-            except (ChunkedEncodingError, http.client.IncompleteRead, RequestException) as e:
-                if not had_events and "InvalidChunkLength" not in str(e):
-                    raise
-            finally:
-                try:
-                    response.close()
-                except Exception:
-                    pass
-
-            st.session_state.waiting_for_feedback = needs_feedback
-            st.session_state.finished = not needs_feedback
-            if needs_feedback:
-                st.rerun()
-            else:
+            data = worker.events.get_nowait()
+        except queue.Empty:
+            break
+        needs_rerun = apply_stream_event(data) or needs_rerun
+    if worker.done.is_set() and worker.events.empty():
+        st.session_state.stream_worker = None
+        if worker.error:
+            st.session_state.stream_error = worker.error
+        else:
+            st.session_state.waiting_for_feedback = worker.interrupted
+            st.session_state.finished = not worker.interrupted
+            if not worker.interrupted:
                 st.session_state.display_mode = "current"
-                st.success("流程已完成，已生成最终研报。")
-
-        except Exception as e:
-            st.error(f"流式连接错误：{e}")
+                st.session_state.flash = "流程已完成，已生成最终研报。"
+        st.rerun()
+    live = st.session_state.messages[st.session_state.log_rendered:]
+    if needs_rerun:
+        st.rerun()
+    if len(live) > LIVE_LOG_MAX_ENTRIES:
+        st.caption(f"另有 {len(live) - LIVE_LOG_MAX_ENTRIES} 条较早的新日志未展开。")
+    for entry in live[-LIVE_LOG_MAX_ENTRIES:]:
+        render_log_entry(st, entry)
+    st.caption("正在生成研报…")
+
+
+if (
+    st.session_state.thread_id
+    and not st.session_state.waiting_for_feedback
+    and not st.session_state.finished
+    and not st.session_state.stream_error
+):
+    worker = st.session_state.stream_worker
+    if worker is None or worker.thread_id != st.session_state.thread_id:
+        st.session_state.stream_worker = StreamWorker(st.session_state.thread_id)
+
+if st.session_state.flash:
+    st.success(st.session_state.flash)
+    st.session_state.flash = ""
+
+if st.session_state.stream_error:
+    st.error(f"流式连接错误：{st.session_state.stream_error}")
+    if st.button("重新连接", key="stream_retry_btn"):
+        st.session_state.stream_error = ""
+        st.rerun()
 
+tab_report, tab_logs, tab_sources = st.tabs(["研报", "执行日志", "资料来源"])
 
-if st.session_state.finished and st.session_state.final_report and st.session_state.thread_id:
-    if st.session_state.thread_id not in st.session_state.history_saved_ids:
-        saved = save_history(
-            st.session_state.thread_id,
-            st.session_state.current_topic or topic,
-            st.session_state.final_report,
-            st.session_state.sources,
-        )
-        if saved:
-            st.session_state.history_saved_ids.add(st.session_state.thread_id)
-            st.session_state.history_list = fetch_history_list()
+with tab_logs:
+    log_container = st.container()
+    messages = st.session_state.messages
+    if messages:
+        older = max(0, len(messages) - LOG_TAIL_ENTRIES)
+        if older:
+            # One markdown block without raw data, and only on request.
+            if log_container.toggle("显示全部日志", key="show_all_logs"):
+                log_container.markdown("\n".join(f"- {entry['text']}" for entry in messages[:older]))
+            else:
+                log_container.caption(f"已折叠 {older} 条较早的日志。")
+        for entry in messages[older:]:
+            render_log_entry(log_container, entry)
+    elif not st.session_state.stream_worker:
+        log_container.markdown("暂无日志。")
+    st.session_state.log_rendered = len(st.session_state.messages)
+    if st.session_state.stream_worker:
+        stream_progress()
 
 
 with tab_report:
@@ -432,7 +672,7 @@ with tab_report:
 
         if followup_btn and followup_question.strip():
             try:
-                resp = requests.post(
+                resp = http_session.post(
                     f"{BASE_URL}/history/followup",
                     json={
                         "history_id": detail.get("id"),
@@ -449,6 +689,7 @@ with tab_report:
                     st.session_state.finished = False
                     st.session_state.final_report = ""
                     st.session_state.sources = detail.get("sources", [])
+                    st.session_state.stream_error = ""
                     st.session_state.display_mode = "current"
                     st.success("已开始基于历史记录继续追问。")
                     st.rerun()
@@ -458,12 +699,12 @@ with tab_report:
                 st.error(f"请求失败：{e}")
         if delete_btn:
             try:
-                resp = requests.delete(f"{BASE_URL}/history/{detail.get('id')}")
+                resp = http_session.delete(f"{BASE_URL}/history/{detail.get('id')}")
                 if resp.status_code == 200:
-                    st.session_state.history_list = fetch_history_list()
+                    invalidate_history(detail.get("id"))
+                    reload_history()
                     st.session_state.history_selected_id = None
                     st.session_state.history_view = None
-                    st.session_state.history_details.pop(detail.get("id"), None)
                     st.session_state.display_mode = "current"
                     st.success("已删除该记录。")
                     st.rerun()
@@ -505,7 +746,7 @@ with tab_report:
 
             if approve:
                 try:
-                    resp = requests.post(
+                    resp = http_session.post(
                         f"{BASE_URL}/feedback",
                         json={
                             "thread_id": st.session_state.thread_id,
@@ -527,7 +768,7 @@ with tab_report:
                     st.warning("请填写驳回原因。")
                 else:
                     try:
-                        resp = requests.post(
+                        resp = http_session.post(
                             f"{BASE_URL}/feedback",
                             json={
                                 "thread_id": st.session_state.thread_id,